@@ -0,0 +1,60 @@
+"""Measure how RPC bookkeeping scales with the number of outstanding calls.
+
+Calls are sent into a transport that drops everything, so each of them stays
+outstanding until it is expired by the timer wheel.
+
+    python -m benchmarks.outstanding_rpcs 1000 10000 100000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from kademlia import ID, Node
+from kademlia.rpc import RpcProtocol
+
+
+class NullTransport(asyncio.DatagramTransport):
+    def sendto(self, data, addr=None):
+        pass
+
+    def close(self):
+        pass
+
+
+async def run(outstanding: int, timeout: float, resolution: float):
+    loop = asyncio.get_running_loop()
+    rpc = RpcProtocol(loop, Node(ID(0), ('127.0.0.1', 0)), None,
+                      timeout, resolution)
+    rpc.connection_made(NullTransport())
+
+    start = time.perf_counter()
+    futures = [rpc.call(('127.0.0.1', 1), 'ping')
+               for _ in range(outstanding)]
+    issued = time.perf_counter()
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    expired = time.perf_counter()
+
+    assert all(isinstance(r, asyncio.TimeoutError) for r in results)
+    assert not rpc.requests
+    rpc.close()
+    return issued - start, expired - issued - timeout
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--timeout', type=float, default=1)
+    ap.add_argument('--resolution', type=float, default=.1)
+    ap.add_argument('sizes', nargs='*', type=int,
+                    default=[1000, 10000, 50000, 100000])
+    args = ap.parse_args()
+    logging.getLogger('kademlia').setLevel(logging.ERROR)
+
+    print(f'{"outstanding":>12} {"issue us/call":>14} {"expiry lag ms":>14}')
+    for n in args.sizes:
+        issue, lag = asyncio.run(run(n, args.timeout, args.resolution))
+        print(f'{n:>12} {issue / n * 1e6:>14.2f} {lag * 1e3:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
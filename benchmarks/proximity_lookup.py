@@ -0,0 +1,89 @@
+"""Compare value lookup latency with and without proximity-aware routing.
+
+Nodes are spread over regions of a simulated network; links inside a
+region are fast and links across regions are slow. Each measured lookup
+is a get() of a stored key from a node not holding it.
+
+    python -m benchmarks.proximity_lookup --nodes 100 --lookups 100
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+
+from kademlia import Config, ID, Server
+from kademlia.simulation import Network
+
+
+async def run(args, proximity: bool) -> list:
+    rand = random.Random(args.seed)
+    region = {}
+
+    def latency(src, dst):
+        # one-way delay in seconds
+        far = abs(region[src] - region[dst])
+        return (args.local + far * args.remote) / 1000
+
+    network = Network(latency)
+    servers = []
+    for i in range(args.nodes):
+        addr = ('10.0.0.1', i)
+        region[addr] = rand.randrange(args.regions)
+        server = Server(addr, ID(rand.getrandbits(160)),
+                        config=Config(proximity=proximity))
+        bootstrap = [rand.choice(servers).node] if servers else None
+        await server.start(bootstrap, network.transport(addr))
+        servers.append(server)
+
+    # fill routing tables and RTT estimates
+    for _ in range(args.warmup):
+        await asyncio.gather(*(s._lookup_node(ID(rand.getrandbits(160)))
+                               for s in servers))
+
+    keys = [ID(rand.getrandbits(160)) for _ in range(args.lookups)]
+    await asyncio.gather(*(rand.choice(servers).set(key, b'value')
+                           for key in keys))
+    await asyncio.sleep(1)
+
+    loop = asyncio.get_running_loop()
+
+    async def timed_get(key):
+        server = rand.choice([s for s in servers if key not in s.storage])
+        start = loop.time()
+        await server.get(key)
+        return loop.time() - start
+
+    # one at a time, so that CPU time does not add to the latency
+    times = [await timed_get(key) for key in keys]
+    for server in servers:
+        await server.close()
+    return times
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--nodes', type=int, default=100)
+    ap.add_argument('--regions', type=int, default=5)
+    ap.add_argument('--local', type=float, default=2,
+                    help='one-way delay inside a region (ms)')
+    ap.add_argument('--remote', type=float, default=20,
+                    help='extra one-way delay per region hop (ms)')
+    ap.add_argument('--warmup', type=int, default=1,
+                    help='rounds of random lookups from every node')
+    ap.add_argument('--lookups', type=int, default=100)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+    logging.getLogger('kademlia').setLevel(logging.ERROR)
+
+    for proximity in (False, True):
+        times = asyncio.run(run(args, proximity))
+        times.sort()
+        print(f'proximity={proximity!s:5}  '
+              f'mean={statistics.mean(times) * 1e3:7.1f}ms  '
+              f'p50={times[len(times) // 2] * 1e3:7.1f}ms  '
+              f'p90={times[int(len(times) * .9)] * 1e3:7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Time finding the keys to hand off to a new neighbour.
+
+Compares scanning every stored key against the ordered storage index.
+Stored keys are spread around our ID, as a node stores the keys closest
+to it, and new nodes join at random distances within that spread.
+
+    python -m benchmarks.storage_handoff --keys 1000000
+"""
+import argparse
+import random
+import time
+
+from kademlia.storage import Storage, Value
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument('--keys', type=int, default=1000000)
+    ap.add_argument('--joins', type=int, default=20)
+    ap.add_argument('--spread', type=int, default=140,
+                    help='bits of XOR distance between stored keys and us')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    rand = random.Random(args.seed)
+    me = rand.getrandbits(160)
+    value = Value(b'', 0)
+    storage = Storage()
+    start = time.perf_counter()
+    for _ in range(args.keys):
+        storage[me ^ rand.getrandbits(args.spread)] = value
+    storage.range(0, 0)  # sort the index
+    print(f'insert + index {args.keys} keys: '
+          f'{time.perf_counter() - start:.2f}s')
+
+    scan = index = found = 0.
+    for _ in range(args.joins):
+        bit = rand.randrange(args.spread)
+        new = me ^ (1 << bit) ^ rand.getrandbits(bit)
+
+        start = time.perf_counter()
+        expected = [k for k in storage
+                    if k ^ new < k ^ me and (k ^ me) >> bit == 1]
+        scan += time.perf_counter() - start
+
+        start = time.perf_counter()
+        keys = storage.branch(new, me)
+        index += time.perf_counter() - start
+
+        assert sorted(expected) == keys
+        found += len(keys)
+
+    print(f'{args.joins} joins, {found / args.joins:.0f} keys handed off '
+          'on average')
+    print(f'  full scan: {scan / args.joins * 1e3:9.2f} ms/join')
+    print(f'  index:     {index / args.joins * 1e3:9.2f} ms/join')
+
+
+if __name__ == '__main__':
+    main()
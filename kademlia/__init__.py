@@ -1,2 +1,4 @@
+from .config import Config  # noqa
 from .node import ID, Node  # noqa
 from .protocol import Server  # noqa
+from .storage import Value  # noqa
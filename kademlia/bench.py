@@ -0,0 +1,153 @@
+"""Load generator and latency benchmark behind `kad bench`."""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, asdict
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence
+
+from .node import ID, Node
+from .protocol import Server
+
+PERCENTILES = (('p50', .5), ('p90', .9), ('p99', .99), ('p999', .999))
+
+
+@dataclass
+class Workload:
+    reads: float = .9
+    keys: int = 1000
+    distribution: str = 'uniform'
+    zipf_s: float = 1.
+    value_size: int = 100
+    concurrency: int = 16
+    duration: float = 10.
+    preload: bool = True
+    seed: int = 0
+
+
+class KeyChooser:
+    def __init__(self, workload: Workload) -> None:
+        self.random = random.Random(workload.seed)
+        self.keys = [ID(self.random.getrandbits(160))
+                     for _ in range(workload.keys)]
+        if workload.distribution == 'zipf':
+            weights = (1 / (i + 1) ** workload.zipf_s
+                       for i in range(workload.keys))
+            self.cum_weights: Optional[List[float]] = list(
+                accumulate(weights))
+        elif workload.distribution == 'uniform':
+            self.cum_weights = None
+        else:
+            raise ValueError(
+                f'unknown distribution: {workload.distribution}')
+
+    def __call__(self) -> ID:
+        if self.cum_weights is None:
+            return self.random.choice(self.keys)
+        return self.random.choices(self.keys, cum_weights=self.cum_weights)[0]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """Count, mean and nearest-rank percentiles in milliseconds."""
+    if not latencies:
+        return {'count': 0}
+    latencies = sorted(latencies)
+    n = len(latencies)
+    summary = {'count': n, 'mean': sum(latencies) / n * 1e3}
+    for name, q in PERCENTILES:
+        summary[name] = latencies[min(n - 1, int(q * n))] * 1e3
+    return summary
+
+
+async def spawn_cluster(size: int, port: int, bootstrap: Node
+                        ) -> List[Server]:
+    """Start `size` local nodes on consecutive ports after `port`."""
+    nodes = []
+    for i in range(1, size + 1):
+        node = Server(('127.0.0.1', port + i))
+        await node.start([bootstrap])
+        nodes.append(node)
+    return nodes
+
+
+async def run(dht: Server, workload: Workload,
+              cluster: Sequence[Server] = ()) -> dict:
+    """Run the workload with its workers spread over `dht` and `cluster`.
+
+    Reads skip the local copy, every node holds every key in a cluster
+    smaller than k, so they time real lookups.
+    """
+    choose = KeyChooser(workload)
+    clients = [dht, *cluster]
+    value = bytes(workload.value_size)
+    latencies: Dict[str, List[float]] = {'read': [], 'write': []}
+    errors = {'read': 0, 'write': 0}
+
+    if workload.preload:
+        sem = asyncio.Semaphore(workload.concurrency)
+
+        async def preload(key: ID) -> None:
+            async with sem:
+                await dht.set(key, value)
+
+        await asyncio.gather(*map(preload, choose.keys),
+                             return_exceptions=True)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + workload.duration
+
+    async def worker(client: Server):
+        while loop.time() < deadline:
+            op = 'read' if choose.random.random() < workload.reads \
+                else 'write'
+            key = choose()
+            start = time.perf_counter()
+            try:
+                if op == 'read':
+                    await client.get(key, local=False)
+                else:
+                    await client.set(key, value)
+            except Exception:
+                errors[op] += 1
+            else:
+                latencies[op].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(clients[i % len(clients)])
+                           for i in range(workload.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ops = sum(map(len, latencies.values()))
+    return {
+        'workload': asdict(workload),
+        'elapsed': elapsed,
+        'ops': ops,
+        'throughput': ops / elapsed,
+        'errors': errors,
+        'latency_ms': {op: summarize(lat) for op, lat in latencies.items()},
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"{report['ops']} ops in {report['elapsed']:.2f}s, "
+          f"{report['throughput']:.1f} ops/s, errors: {report['errors']}")
+    for op, summary in report['latency_ms'].items():
+        if not summary['count']:
+            continue
+        cols = ' '.join(f'{name}={summary[name]:.2f}'
+                        for name, _ in PERCENTILES)
+        print(f"  {op:>5}: n={summary['count']} "
+              f"mean={summary['mean']:.2f} {cols} (ms)")
+
+
+def write_json(report: dict, path: str) -> None:
+    if path == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
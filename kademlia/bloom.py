@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from hashlib import blake2b
+from typing import Iterable, Iterator, Tuple
+
+Item = Tuple[int, int]  # (key, version)
+
+
+def _positions(item: Item, hashes: int, size: int, seed: int
+               ) -> Iterator[int]:
+    key, version = item
+    digest = blake2b(key.to_bytes(20, 'big')
+                     + (version % 2 ** 64).to_bytes(8, 'big'),
+                     digest_size=16, salt=seed.to_bytes(8, 'big')).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:], 'big') | 1
+    return ((h1 + i * h2) % size for i in range(hashes))
+
+
+@dataclass
+class BloomFilter:
+    """A compact summary of (key, version) pairs sent to replica neighbours.
+
+    A new `seed` for every exchange makes false positives differ between
+    rounds, so values missed once are caught by a later round.
+    """
+    bits: bytes
+    hashes: int
+    seed: int
+
+    @classmethod
+    def build(cls, items: Iterable[Item], count: int, size: int = 32768,
+              seed: int = 0) -> BloomFilter:
+        """Summarize `count` items in `size` bits."""
+        hashes = max(1, min(16, round(size / max(count, 1) * math.log(2))))
+        bits = bytearray(size // 8)
+        for item in items:
+            for pos in _positions(item, hashes, size, seed):
+                bits[pos >> 3] |= 1 << (pos & 7)
+        return cls(bytes(bits), hashes, seed)
+
+    def __contains__(self, item: Item) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & 1 << (pos & 7) for pos in
+                   _positions(item, self.hashes, len(bits) * 8, self.seed))
@@ -0,0 +1,40 @@
+"""Transparent value compression.
+
+Values are compressed with a stdlib codec before being stored and carry
+the codec ID, so any node can decompress them. These functions may run in
+a process pool and must stay at module level.
+"""
+import lzma
+import zlib
+from typing import Tuple
+
+NONE = 0
+ZLIB = 1
+LZMA = 2
+
+CODECS = {'none': NONE, 'zlib': ZLIB, 'lzma': LZMA}
+
+
+def compress(data: bytes, codec: int) -> Tuple[bytes, int]:
+    """Compress the data, keeping it as is if that does not save space."""
+    if codec == ZLIB:
+        packed = zlib.compress(data)
+    elif codec == LZMA:
+        packed = lzma.compress(data)
+    elif codec == NONE:
+        return data, NONE
+    else:
+        raise ValueError(f'unknown codec: {codec}')
+    if len(packed) >= len(data):
+        return data, NONE
+    return packed, codec
+
+
+def decompress(data: bytes, codec: int) -> bytes:
+    if codec == NONE:
+        return data
+    elif codec == ZLIB:
+        return zlib.decompress(data)
+    elif codec == LZMA:
+        return lzma.decompress(data)
+    raise ValueError(f'unknown codec: {codec}')
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import math
+
+
+class AdaptiveConcurrency:
+    """AIMD controller of the lookup parallelism α.
+
+    Replies within `rtt_ratio` times the usual RTT of the peer grow α by
+    about one per α replies, slower replies shrink it by as much and
+    timeouts halve it, like TCP congestion control. Comparing each peer
+    with itself keeps distant peers from counting as congested.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int,
+                 rtt_ratio: float = 2) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.rtt_ratio = rtt_ratio
+        self.value = float(initial)
+
+    def __int__(self) -> int:
+        return max(self.minimum, min(self.maximum, int(self.value)))
+
+    def __repr__(self) -> str:
+        return f'<AdaptiveConcurrency α={self.value:.2f}>'
+
+    def _clamp(self, value: float) -> None:
+        self.value = max(self.minimum, min(self.maximum, value))
+
+    def on_reply(self, rtt: float, baseline: float = math.inf) -> None:
+        """Count a reply from a peer whose smoothed RTT is `baseline`."""
+        if rtt <= baseline * self.rtt_ratio:
+            self._clamp(self.value + 1 / self.value)
+        else:
+            self._clamp(self.value - 1 / self.value)
+
+    def on_timeout(self) -> None:
+        self._clamp(self.value / 2)
@@ -1,2 +1,61 @@
-ksize = 20
-asize = 3
\ No newline at end of file
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class Config:
+    """Tunable parameters of a `Server`."""
+    # bucket size and number of replicas
+    ksize: int = 20
+    # lookup parallelism, the initial one if `adaptive` is set
+    asize: int = 3
+    # adjust asize to observed loss and RTT, between min_asize and max_asize
+    adaptive: bool = False
+    min_asize: int = 1
+    max_asize: int = 16
+
+    # RPC timeout and the granularity its deadlines are rounded to
+    timeout: float = 30
+    timer_resolution: float = .1
+
+    # seconds between event loop lag samples, 0 disables them
+    monitor_interval: float = 1
+    # loop lags and RPC decoding, handling or encoding taking longer are
+    # logged
+    slow_callback: float = .1
+
+    # stores that must succeed before Server.set() returns
+    write_quorum: int = 3
+    # replies Server.get() resolves the newest version from
+    read_quorum: int = 1
+
+    proximity: bool = True
+    # replace a contact in a full bucket by one this many times faster
+    proximity_ratio: float = 2
+    # lookups query the fastest candidate within this many bits of distance
+    # from the closest one
+    proximity_slack: int = 1
+
+    # routing table limit, buckets are no longer split beyond it
+    max_buckets: int = 160
+    # storage cap, stores of new keys are rejected beyond it
+    max_keys: Optional[int] = None
+
+    # keys served more than hot_threshold times per hot_window seconds are
+    # also cached for hot_ttl seconds on the hot_fanout contacts closest to
+    # them after the replicas, 0 disables this
+    hot_threshold: int = 100
+    hot_window: float = 10
+    hot_fanout: int = 20
+    hot_ttl: float = 60
+
+    # values at least this large are compressed with `compression`
+    compress_threshold: int = 1024
+    compression: Optional[str] = 'zlib'
+
+    # seconds between anti-entropy rounds with a replica neighbour, 0
+    # disables them
+    sync_interval: float = 600
+    # keys summarized per round and the size of their Bloom filter in bits
+    sync_chunk: int = 2048
+    sync_filter_bits: int = 32768
@@ -0,0 +1,169 @@
+"""Network crawler behind `kad crawl`.
+
+Each discovered node is asked find_node() for IDs differing from its own
+at successively lower bits, so every reply lists the contacts of one of
+its buckets. The sweep of a node stops once its buckets are deeper than
+the network is large and stop revealing new nodes.
+
+Results are streamed as msgpack arrays `[id, host, port, rtt]`, one per
+node, with the ID as 20 little-endian bytes and the RTT of its first reply
+in microseconds or nil if it never replied. `read_records()` reads them.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import socket
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Set, Tuple
+
+import msgpack
+
+from .node import ID, Node
+from .rpc import RpcError, RpcProtocol
+from .storage import Value
+
+log = logging.getLogger(__name__)
+# room for a burst of replies to thousands of queries
+RECEIVE_BUFFER = 8 * 2 ** 20
+# the serialized form of a Node, decoding replies as such instead of
+# List[Node] takes half the time
+RawNode = Tuple[None, Tuple[Tuple[int], Tuple[str, int]]]
+
+
+@dataclass
+class CrawlStats:
+    nodes: int = 0
+    responsive: int = 0
+    queries: int = 0
+    failures: int = 0
+    elapsed: float = 0.
+
+
+class Crawler:
+    """Breadth-first sweep of the network from some bootstrap nodes.
+
+    At most `concurrency` queries are in flight, each node is queried once
+    per `interval` at most and contacts already seen are not queued again.
+    """
+
+    def __init__(self, rpc: RpcProtocol, out: BinaryIO,
+                 concurrency: int = 1000, interval: float = .1,
+                 ksize: int = 20) -> None:
+        self.rpc = rpc
+        self.out = out
+        self.concurrency = concurrency
+        self.interval = interval
+        self.ksize = ksize
+        self.stats = CrawlStats()
+
+        self._seen: Set[ID] = {rpc.caller.id}
+        self._queue: asyncio.Queue[Tuple[Node, int]] = asyncio.Queue()
+        self._pending = 0
+        self._done = asyncio.Event()
+        self._packer = msgpack.Packer()
+
+        # crawled nodes add us to their routing tables, so answer like a
+        # node knowing no one and storing nothing
+        @rpc.register
+        def ping() -> str:
+            return 'pong'
+
+        # also tells how to decode replies to our queries
+        @rpc.register
+        def find_node(id: ID) -> List[RawNode]:
+            return []
+
+        @rpc.register
+        def find_value(id: ID) -> Tuple[List[Node], Optional[Value]]:
+            return [], None
+
+    def _add(self, node: Node) -> bool:
+        if node.id in self._seen:
+            return False
+        self._seen.add(node.id)
+        self.stats.nodes += 1
+        self._pending += 1
+        self._put((node, 0))
+        return True
+
+    @staticmethod
+    def _nodes(raw: List[RawNode]) -> List[Node]:
+        return [Node(ID(id), addr) for _, ((id,), addr) in raw]
+
+    def _put(self, item: Tuple[Node, int]) -> None:
+        self._queue.put_nowait(item)
+
+    def _depth(self) -> int:
+        """Bucket depth down to which buckets are expected to be full."""
+        return int(math.log2(max(len(self._seen) / self.ksize, 1)))
+
+    def _write(self, node: Node, rtt: Optional[float]) -> None:
+        host, port = node.addr
+        self.out.write(self._packer.pack([
+            node.id.to_bytes(20, 'little'), host, port,
+            None if rtt is None else round(rtt * 1e6)]))
+
+    async def _query(self, node: Node, depth: int) -> None:
+        target = ID(node.id ^ (1 << (159 - depth)))
+        self.stats.queries += 1
+        start = self.rpc.loop.time()
+        try:
+            nodes = self._nodes(
+                await self.rpc.call(node.addr, 'find_node', target))
+        except (asyncio.TimeoutError, RpcError) as exc:
+            self.stats.failures += 1
+            log.debug(f'Query of {node} failed: {exc!r}')
+            if depth == 0:
+                self._write(node, None)
+            return
+        if depth == 0:
+            self.stats.responsive += 1
+            self._write(node, self.rpc.loop.time() - start)
+        fresh = sum(map(self._add, nodes))
+        if depth < 159 and (fresh or depth < self._depth()):
+            self._pending += 1
+            self.rpc.loop.call_later(
+                self.interval, self._put, (node, depth + 1))
+
+    async def _worker(self) -> None:
+        while True:
+            node, depth = await self._queue.get()
+            try:
+                await self._query(node, depth)
+            finally:
+                self._pending -= 1
+                if not self._pending:
+                    self._done.set()
+
+    async def crawl(self, bootstrap: Iterable[Node]) -> CrawlStats:
+        start = time.perf_counter()
+        for node in bootstrap:
+            self._add(node)
+        if not self._pending:
+            return self.stats
+        workers = [asyncio.create_task(self._worker())
+                   for _ in range(self.concurrency)]
+        try:
+            await self._done.wait()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self.stats.elapsed = time.perf_counter() - start
+        return self.stats
+
+
+def enlarge_receive_buffer(rpc: RpcProtocol,
+                           size: int = RECEIVE_BUFFER) -> None:
+    sock = rpc.transport.get_extra_info('socket')
+    if sock is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+
+
+def read_records(f: BinaryIO) -> Iterator[Tuple[Node, Optional[float]]]:
+    """Nodes and RTTs in seconds from a crawl output file."""
+    for id, host, port, rtt in msgpack.Unpacker(f, raw=False):
+        node = Node(ID(int.from_bytes(id, 'little')), (host, port))
+        yield node, None if rtt is None else rtt / 1e6
@@ -1,9 +1,11 @@
 import argparse
 import asyncio
 import logging
+import random
 import sys
 
-from kademlia import ID, Node, Server
+from kademlia import ID, Node, Server, bench, crawler, gateway, replay, rpc
+from kademlia.trace import TraceWriter
 
 
 class AioInput:
@@ -46,27 +48,119 @@ def make_args():
                                                   'DEBUG', 'NOTSET'),
                     default='WARNING',
                     help='Set logging level. (default: DEBUG)')
+    ap.add_argument('--trace', metavar='PATH',
+                    help='Record the datagrams of the node to a trace file.')
+
+    commands = ap.add_subparsers(dest='command', metavar='command')
+    commands.add_parser('repl', help='Interactive shell. (default)')
+    gw = commands.add_parser(
+        'gateway', help='Serve get/set to local processes over HTTP.')
+    gw.add_argument('--unix', metavar='PATH',
+                    help='Listen on a Unix socket instead of TCP.')
+    gw.add_argument('--http-port', default=8468, type=int,
+                    help='TCP port to listen. (default: 8468)')
+
+    default = bench.Workload()
+    bn = commands.add_parser(
+        'bench', help='Drive a get/set workload and report latencies.')
+    bn.add_argument('--reads', type=float, default=default.reads,
+                    help=f'Fraction of reads. (default: {default.reads})')
+    bn.add_argument('--keys', type=int, default=default.keys,
+                    help=f'Number of distinct keys. (default: {default.keys})')
+    bn.add_argument('--distribution', choices=('uniform', 'zipf'),
+                    default=default.distribution,
+                    help='Key popularity. (default: uniform)')
+    bn.add_argument('--zipf-s', type=float, default=default.zipf_s,
+                    help=f'Zipf exponent. (default: {default.zipf_s})')
+    bn.add_argument('--value-size', type=int, default=default.value_size,
+                    help=f'Bytes per value. (default: {default.value_size})')
+    bn.add_argument('--concurrency', '-c', type=int,
+                    default=default.concurrency,
+                    help='Concurrent requests. '
+                         f'(default: {default.concurrency})')
+    bn.add_argument('--duration', '-d', type=float, default=default.duration,
+                    help=f'Seconds to run. (default: {default.duration})')
+    bn.add_argument('--no-preload', dest='preload', action='store_false',
+                    help='Do not write every key before the run.')
+    bn.add_argument('--seed', type=int, default=default.seed,
+                    help=f'Random seed. (default: {default.seed})')
+    bn.add_argument('--cluster', type=int, default=0, metavar='N',
+                    help='Spawn N local nodes on the ports after --port.')
+    bn.add_argument('--json', metavar='PATH',
+                    help='Also write the report as JSON (- for stdout).')
+
+    cr = commands.add_parser(
+        'crawl', help='Enumerate the network from the bootstrap peers.')
+    cr.add_argument('--output', '-o', required=True, metavar='PATH',
+                    help='File to stream the nodes and RTTs found to.')
+    cr.add_argument('--host', default='127.0.0.1',
+                    help='Address peers reach us at. (default: 127.0.0.1)')
+    cr.add_argument('--concurrency', '-c', type=int, default=1000,
+                    help='Queries in flight. (default: 1000)')
+    cr.add_argument('--interval', type=float, default=.1,
+                    help='Seconds between queries of a peer. (default: 0.1)')
+    cr.add_argument('--timeout', type=float, default=2,
+                    help='Seconds to wait for a reply. (default: 2)')
+
+    rp = commands.add_parser(
+        'replay', help='Feed a trace to a local node and time it.')
+    rp.add_argument('path', help='Trace file recorded with --trace.')
+    rp.add_argument('--speed', type=float,
+                    help='Replay at this multiple of the recorded pace. '
+                         '(default: as fast as possible)')
+    rp.add_argument('--json', metavar='PATH',
+                    help='Also write the report as JSON (- for stdout).')
     return ap.parse_args()
 
 
-async def start_repl():
-    args = make_args()
-    logging.basicConfig(level=getattr(logging, args.log_level))
+def parse_nodes(infos):
+    nodes = []
+    for info in infos:
+        id, host, port = info.split(',')
+        nodes.append(Node(ID(int(id)), (host, int(port))))
+    return nodes
+
 
+async def start_node(args) -> Server:
     if args.bootstrap is None:
         bootstrap_nodes = None
     else:
-        bootstrap_nodes = []
-        for info in args.bootstrap:
-            id, host, port = info.split(',')
-            id = ID(int(id))
-            port = int(port)
-            bootstrap_nodes.append(Node(id, (host, port)))
+        bootstrap_nodes = parse_nodes(args.bootstrap)
 
     id = ID(int(args.id)) if args.id else None
     dht = Server(('127.0.0.1', args.port), id)
-    await dht.start(bootstrap_nodes)
-
+    trace = TraceWriter.open(args.trace, dht.node) if args.trace else None
+    await dht.start(bootstrap_nodes, trace=trace)
+    return dht
+
+
+async def run_gateway(dht: Server, args) -> None:
+    runner = await gateway.serve(dht, args.unix, port=args.http_port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_bench(dht: Server, args) -> None:
+    cluster = await bench.spawn_cluster(args.cluster, args.port, dht.node)
+    workload = bench.Workload(
+        reads=args.reads, keys=args.keys, distribution=args.distribution,
+        zipf_s=args.zipf_s, value_size=args.value_size,
+        concurrency=args.concurrency, duration=args.duration,
+        preload=args.preload, seed=args.seed)
+    try:
+        report = await bench.run(dht, workload, cluster)
+    finally:
+        for node in cluster:
+            await node.close()
+    report['cluster'] = args.cluster
+    bench.print_report(report)
+    if args.json:
+        bench.write_json(report, args.json)
+
+
+async def run_repl(dht: Server) -> None:
     while True:
         with AioInput() as ainput:
             try:
@@ -79,12 +173,21 @@ async def start_repl():
             if cmds[0] == 'help':
                 print('Cmds:\n'
                       '   info\n'
+                      '   health\n'
                       '   set <id:int> <data>\n'
                       '   get <id>')
             elif cmds[0] == 'info':
                 print(f'  Server: {dht}\n'
                       f'  Nodes: {dht.routing_table}\n'
                       f'  Storage: {dht.storage}')
+            elif cmds[0] == 'health':
+                health = dht.health()
+                print(f"  Loop lag: {health['loop_lag']}")
+                for func, times in health['handlers'].items():
+                    print(f'  {func}(): {times}')
+                for key, hot in health['hot_keys'].items():
+                    print(f'  Hot key {key}: {hot}')
+                print(f"  Cached copies: {health['cached']}")
             elif cmds[0] == 'set' or cmds[0] == 'get':
                 id = ID(int(cmds[1]))
                 if cmds[0] == 'set':
@@ -95,5 +198,57 @@ async def start_repl():
                 print('Unknown cmd.')
 
 
+async def run_crawl(args) -> None:
+    if not args.bootstrap:
+        sys.exit('crawl needs --bootstrap peers')
+    id = ID(int(args.id)) if args.id else ID(random.getrandbits(160))
+    protocol = await rpc.start(Node(id, (args.host, args.port)),
+                               timeout=args.timeout)
+    crawler.enlarge_receive_buffer(protocol)
+    try:
+        with open(args.output, 'wb') as out:
+            stats = await crawler.Crawler(
+                protocol, out, args.concurrency, args.interval
+            ).crawl(parse_nodes(args.bootstrap))
+    finally:
+        protocol.close()
+    print(f'{stats.nodes} nodes, {stats.responsive} responsive, '
+          f'{stats.queries} queries ({stats.failures} failed) '
+          f'in {stats.elapsed:.1f}s')
+
+
+async def run_replay(args) -> None:
+    with open(args.path, 'rb') as f:
+        report = await replay.replay(f, args.speed)
+    replay.print_report(report)
+    if args.json:
+        bench.write_json(report, args.json)
+
+
+async def run(args) -> None:
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    if args.command == 'crawl':
+        await run_crawl(args)
+        return
+    elif args.command == 'replay':
+        await run_replay(args)
+        return
+    dht = await start_node(args)
+    try:
+        if args.command == 'gateway':
+            await run_gateway(dht, args)
+        elif args.command == 'bench':
+            await run_bench(dht, args)
+        else:
+            await run_repl(dht)
+    finally:
+        await dht.close()
+        if dht.rpc.trace is not None:
+            dht.rpc.trace.close()
+
+
 def main():
-    asyncio.run(start_repl())
+    try:
+        asyncio.run(run(make_args()))
+    except KeyboardInterrupt:
+        pass
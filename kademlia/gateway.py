@@ -0,0 +1,142 @@
+"""Local HTTP gateway letting processes share one DHT node.
+
+    GET  /keys/<id>   value bytes, 404 if not found
+    PUT  /keys/<id>   store the request body
+    POST /get_many    msgpack list of ids -> msgpack map of id -> bytes/nil
+
+IDs are decimal integers below 2**160 as in the REPL. The gateway listens
+on TCP or a Unix socket and keeps connections alive, so workers reuse a few
+warm connections; concurrent reads of the same key share one lookup.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List, Optional
+
+import aiohttp
+import msgpack
+from aiohttp import web
+
+from .node import ID
+from .protocol import Server
+
+MSGPACK = 'application/msgpack'
+
+
+class Gateway:
+    def __init__(self, dht: Server) -> None:
+        self.dht = dht
+        self._inflight: Dict[ID, asyncio.Future] = {}
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/keys/{key}', self.handle_get),
+            web.put('/keys/{key}', self.handle_set),
+            web.post('/get_many', self.handle_get_many),
+        ])
+
+    async def get(self, key: ID) -> Optional[bytes]:
+        """Get a value, sharing the lookup with concurrent requests."""
+        try:
+            fut = self._inflight[key]
+        except KeyError:
+            fut = asyncio.ensure_future(self._get(key))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(fut)
+
+    async def _get(self, key: ID) -> Optional[bytes]:
+        try:
+            return await self.dht.get(key)
+        except KeyError:
+            return None
+
+    @staticmethod
+    def _key(text: str) -> ID:
+        try:
+            key = int(text)
+            if not 0 <= key < 2 ** 160:
+                raise ValueError
+        except ValueError:
+            raise web.HTTPBadRequest(text=f'invalid key: {text}') from None
+        return ID(key)
+
+    async def handle_get(self, request: web.Request) -> web.Response:
+        value = await self.get(self._key(request.match_info['key']))
+        if value is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=value)
+
+    async def handle_set(self, request: web.Request) -> web.Response:
+        key = self._key(request.match_info['key'])
+        await self.dht.set(key, await request.read())
+        return web.Response(status=204)
+
+    async def handle_get_many(self, request: web.Request) -> web.Response:
+        keys = msgpack.loads(await request.read(), raw=False)
+        if not isinstance(keys, list):
+            raise web.HTTPBadRequest(text='expected a list of keys')
+        ids = [self._key(str(k)) for k in keys]
+        values = await asyncio.gather(*map(self.get, ids))
+        body = msgpack.dumps(dict(zip(map(str, keys), values)),
+                             use_bin_type=True)
+        return web.Response(body=body, content_type=MSGPACK)
+
+
+async def serve(dht: Server, path: Optional[str] = None,
+                host: str = '127.0.0.1', port: int = 8468) -> web.AppRunner:
+    """Serve the gateway on a Unix socket if `path` is given, else on TCP."""
+    runner = web.AppRunner(Gateway(dht).app, access_log=None)
+    await runner.setup()
+    if path is not None:
+        site: web.BaseSite = web.UnixSite(runner, path)
+    else:
+        site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
+
+
+class Client:
+    """Gateway client keeping a pool of keep-alive connections."""
+
+    def __init__(self, url: str = 'http://127.0.0.1:8468',
+                 path: Optional[str] = None, limit: int = 16) -> None:
+        if path is not None:
+            # the host part is ignored for Unix sockets
+            url = 'http://localhost'
+            connector: aiohttp.BaseConnector = aiohttp.UnixConnector(
+                path, limit=limit)
+        else:
+            connector = aiohttp.TCPConnector(limit=limit)
+        self.url = url
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    async def __aenter__(self) -> Client:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+    async def get(self, key: int) -> Optional[bytes]:
+        async with self.session.get(f'{self.url}/keys/{key}') as resp:
+            if resp.status == 404:
+                return None
+            resp.raise_for_status()
+            return await resp.read()
+
+    async def set(self, key: int, value: bytes) -> None:
+        async with self.session.put(f'{self.url}/keys/{key}',
+                                    data=value) as resp:
+            resp.raise_for_status()
+
+    async def get_many(self, keys: List[int]) -> Dict[int, Optional[bytes]]:
+        body = msgpack.dumps([str(k) for k in keys])
+        async with self.session.post(f'{self.url}/get_many', data=body,
+                                     headers={'Content-Type': MSGPACK}
+                                     ) as resp:
+            resp.raise_for_status()
+            values = msgpack.loads(await resp.read(), raw=False)
+        return {int(k): v for k, v in values.items()}
+
+    async def close(self) -> None:
+        await self.session.close()
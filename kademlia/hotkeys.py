@@ -0,0 +1,95 @@
+"""Detection of frequently read keys.
+
+Reads are counted in a count-min sketch, a few rows of counters indexed by
+independent hashes of the key whose smallest counter bounds the key's count
+from above. Memory is fixed however many keys are read, and halving every
+counter each window turns the counts into recent read rates.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from hashlib import blake2b
+from typing import Dict, List
+
+from .node import ID
+
+
+class CountMinSketch:
+    def __init__(self, width: int = 1024, depth: int = 4) -> None:
+        self.width = width
+        self.depth = depth
+        self.rows: List[List[int]] = [[0] * width for _ in range(depth)]
+        # keys are chosen by clients, a secret salt keeps them from
+        # colliding on purpose
+        self._salt = os.urandom(16)
+
+    def _positions(self, key: int) -> List[int]:
+        # the handlers counting reads accept any integer as a key
+        digest = blake2b((key % 2 ** 160).to_bytes(20, 'big'),
+                         digest_size=16, salt=self._salt).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key: int, count: int = 1) -> int:
+        """Count the key and return its estimated count."""
+        positions = self._positions(key)
+        for row, pos in zip(self.rows, positions):
+            row[pos] += count
+        return min(row[pos] for row, pos in zip(self.rows, positions))
+
+    def __getitem__(self, key: int) -> int:
+        return min(row[pos] for row, pos in
+                   zip(self.rows, self._positions(key)))
+
+    def decay(self) -> None:
+        """Halve every counter."""
+        self.rows = [[c >> 1 for c in row] for row in self.rows]
+
+
+@dataclass
+class HotKey:
+    hits: int
+    # time of the last replication and the nodes that accepted it
+    replicated: float = float('-inf')
+    fanout: int = 0
+
+
+class HotKeys:
+    """Keys read more than `threshold` times per `window` seconds."""
+
+    def __init__(self, threshold: int, window: float, ttl: float) -> None:
+        self.threshold = threshold
+        self.window = window
+        self.ttl = ttl
+        self.sketch = CountMinSketch()
+        self.keys: Dict[ID, HotKey] = {}
+        self._window_end = 0.
+
+    def hit(self, key: ID, now: float) -> bool:
+        """Count a read, return whether the key should be replicated.
+
+        Copies are renewed halfway through their `ttl` while the key stays
+        hot.
+        """
+        if now >= self._window_end:
+            self._next_window(now)
+        hits = self.sketch.add(key)
+        if hits < self.threshold:
+            return False
+        hot = self.keys.get(key)
+        if hot is None:
+            hot = self.keys[key] = HotKey(hits)
+        hot.hits = hits
+        if now - hot.replicated < self.ttl / 2:
+            return False
+        hot.replicated = now
+        return True
+
+    def _next_window(self, now: float) -> None:
+        self.sketch.decay()
+        self._window_end = now + self.window
+        # forget keys whose copies expired
+        self.keys = {key: hot for key, hot in self.keys.items()
+                     if now - hot.replicated < self.ttl}
@@ -0,0 +1,92 @@
+"""Event loop health: scheduling lag and time spent in RPC handlers."""
+from __future__ import annotations
+
+import logging
+from asyncio import AbstractEventLoop, TimerHandle
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Durations counted in power-of-two buckets of microseconds.
+
+    Adding a sample is a few integer operations, percentiles are upper
+    bounds within a factor of two.
+    """
+    BUCKETS = 32
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def __repr__(self) -> str:
+        return f'<Histogram n={self.count} max={self.max * 1e3:.2f}ms>'
+
+    def add(self, seconds: float) -> None:
+        micros = int(seconds * 1e6)
+        self.counts[min(self.BUCKETS - 1, max(micros, 0).bit_length())] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound in seconds of the `q` quantile, 0 if empty."""
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** bucket / 1e6, self.max)
+        return 0.
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean, percentiles and maximum in milliseconds."""
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': self.total / self.count * 1e3,
+            'p50': self.percentile(.5) * 1e3,
+            'p99': self.percentile(.99) * 1e3,
+            'max': self.max * 1e3,
+        }
+
+
+class LoopMonitor:
+    """Samples how late the event loop runs a timer every `interval`.
+
+    Lags over `threshold` are logged, they delay every pending RPC and can
+    make peers time out on us.
+    """
+
+    def __init__(self, loop: AbstractEventLoop, interval: float = 1.,
+                 threshold: float = .1) -> None:
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = Histogram()
+        self._handle: Optional[TimerHandle] = None
+
+    def start(self) -> None:
+        if self._handle is None:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        expected = self.loop.time() + self.interval
+        self._handle = self.loop.call_at(expected, self._sample, expected)
+
+    def _sample(self, expected: float) -> None:
+        # call_at() may fire up to one clock resolution early
+        lag = max(self.loop.time() - expected, 0.)
+        self.lag.add(lag)
+        if lag > self.threshold:
+            log.warning(f'Event loop lagged {lag * 1e3:.0f} ms')
+        self._schedule()
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
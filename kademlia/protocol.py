@@ -3,20 +3,33 @@ from __future__ import annotations
 import asyncio
 import logging
 import random
+from concurrent.futures import Executor
+from dataclasses import dataclass
 from heapq import nsmallest
 from itertools import chain
-from typing import List, Union, Optional, Tuple, Iterator, Callable, Dict
-
-from . import rpc
-from .config import asize, ksize
+from typing import Any, List, Optional, Tuple, Iterator, Callable, Dict, \
+    AsyncGenerator, AsyncIterator, Awaitable, Sequence, Set
+
+from . import codec, rpc
+from .bloom import BloomFilter
+from .concurrency import AdaptiveConcurrency
+from .config import Config
+from .hotkeys import HotKeys
+from .monitor import LoopMonitor
 from .node import ID, Node, Addr
+from .storage import Storage, StorageFull, Value
+from .timer import TimerWheel
+from .trace import TraceWriter
 
 log = logging.getLogger(__name__)
+# stores in flight per destination while handing keys off
+HANDOFF_BATCH = 64
 
 
 class KBucket(List[Node]):
-    def __init__(self, range: Tuple[int, int]) -> None:
+    def __init__(self, range: Tuple[int, int], ksize: int = 20) -> None:
         self.range = range
+        self.ksize = ksize
         super().__init__()
 
     def __repr__(self) -> str:
@@ -26,23 +39,55 @@ class KBucket(List[Node]):
         return self.range[0] <= node.id < self.range[1]
 
     def full(self) -> bool:
-        return len(self) >= ksize
+        return len(self) >= self.ksize
 
-    def divide(self, mask: int) -> Tuple[KBucket, KBucket]:
+    def divide(self) -> Tuple[KBucket, KBucket]:
         mid = (self.range[0] + self.range[1]) // 2
-        left = KBucket((self.range[0], mid))
-        right = KBucket((mid, self.range[1]))
+        left = KBucket((self.range[0], mid), self.ksize)
+        right = KBucket((mid, self.range[1]), self.ksize)
         for node in self:
-            if node.id & mask:
-                right.append(node)
-            else:
+            if node.id < mid:
                 left.append(node)
+            else:
+                right.append(node)
         return left, right
 
 
+class RttTable:
+    """Smoothed round-trip times of the most recently measured contacts."""
+
+    def __init__(self, maxsize: int = 4096, gain: float = 1 / 8) -> None:
+        self.maxsize = maxsize
+        self.gain = gain
+        self._rtt: Dict[Node, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._rtt)
+
+    def __contains__(self, node: Node) -> bool:
+        return node in self._rtt
+
+    def get(self, node: Node, default: float = float('inf')) -> float:
+        return self._rtt.get(node, default)
+
+    def update(self, node: Node, sample: float) -> None:
+        old = self._rtt.pop(node, None)
+        if old is not None:
+            sample = old + self.gain * (sample - old)
+        elif len(self._rtt) >= self.maxsize:
+            del self._rtt[next(iter(self._rtt))]
+        self._rtt[node] = sample
+
+
 class LookupQueue(asyncio.Queue):
-    def __init__(self, xor: Callable[[Node], int], nodes: Iterator[Node]):
+    def __init__(self, xor: Callable[[Node], int], nodes: Iterator[Node],
+                 ksize: int = 20,
+                 rtt: Optional[Callable[[Node], float]] = None,
+                 slack: int = 1):
         self._xor = xor
+        self._ksize = ksize
+        self._rtt = rtt
+        self._slack = slack
         self._queue = nsmallest(ksize, nodes, key=xor)
         # reversed to get better pop() performance
         self._queue.reverse()
@@ -61,61 +106,188 @@ class LookupQueue(asyncio.Queue):
             else:
                 lo = mid + 1
         self._queue.insert(lo, node)
-        self._queue = self._queue[-ksize:]
+        self._queue = self._queue[-self._ksize:]
 
     def _get(self):
-        return self._queue.pop()
+        last = len(self._queue) - 1
+        if self._rtt is None or not last:
+            return self._queue.pop()
+        # Candidates whose distance is within a few bits of the closest one
+        # make about the same progress, the one with the lowest RTT goes
+        # first.
+        best, best_rtt = last, self._rtt(self._queue[last])
+        level = self._xor(self._queue[last]).bit_length()
+        for i in range(last - 1, -1, -1):
+            node = self._queue[i]
+            if self._xor(node).bit_length() > level + self._slack:
+                break
+            rtt = self._rtt(node)
+            if rtt < best_rtt:
+                best, best_rtt = i, rtt
+        return self._queue.pop(best)
+
+
+@dataclass
+class LookupProgress:
+    """A step of an iterative lookup.
+
+    `node` is the peer that just replied or, if `failed`, did not. `closest`
+    are the k closest live nodes known so far and `value` the value
+    returned by `node`, if any.
+    """
+    node: Node
+    closest: List[Node]
+    value: Optional[Value] = None
+    failed: bool = False
+
+
+class QuorumError(Exception):
+    pass
 
 
-class ValueFound(Exception):
-    pass
+def xor_key(id: ID) -> Callable[[Node], int]:
+    return lambda n: n.id ^ id
 
 
-class NodeFound(Exception):
-    pass
+def _ignore_result(fut: asyncio.Future) -> None:
+    if not fut.cancelled():
+        fut.exception()
 
 
-def xor_key(id: ID) -> Callable[[Node], int]:
-    return lambda n: n.id ^ id
+async def wait_quorum(futures: Sequence[asyncio.Future],
+                      quorum: int) -> List:
+    """Wait until `quorum` of the futures succeed and return their results.
+
+    The remaining futures are left running, their failures are ignored.
+    """
+    results: List = []
+    pending = set(futures)
+    try:
+        while len(results) < quorum:
+            if len(results) + len(pending) < quorum:
+                raise QuorumError(f'only {len(results)} of {quorum} '
+                                  'required replies')
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                if not fut.cancelled() and fut.exception() is None:
+                    results.append(fut.result())
+    finally:
+        for fut in pending:
+            fut.add_done_callback(_ignore_result)
+    return results
 
 
 class Server:
-    def __init__(self, addr: Addr, id: Optional[ID] = None) -> None:
+    def __init__(self, addr: Addr, id: Optional[ID] = None,
+                 config: Optional[Config] = None,
+                 executor: Optional[Executor] = None) -> None:
         if id is None:
             id = ID(random.getrandbits(160))
+        if config is None:
+            config = Config()
+        self.config = config
         self.node = Node(id, addr)
         self.node_level = 0
-        self.routing_table: List[KBucket] = [KBucket((0, 2 ** 160))]
-        self.storage: Dict[ID, bytes] = {}
-
-    async def start(self, bootstrap: Optional[List[Node]] = None):
-        self.rpc = await rpc.start(self.node, on_rpc=self.update_routing_table)
+        self.routing_table: List[KBucket] = [
+            KBucket((0, 2 ** 160), config.ksize)]
+        self.storage = Storage()
+        self.rtt = RttTable()
+        self.alpha: Optional[AdaptiveConcurrency] = None
+        if config.adaptive:
+            self.alpha = AdaptiveConcurrency(
+                config.asize, config.min_asize, config.max_asize)
+        self.codec = codec.CODECS[config.compression or 'none']
+        self.monitor: Optional[LoopMonitor] = None
+        self.hot: Optional[HotKeys] = None
+        if config.hot_threshold:
+            self.hot = HotKeys(
+                config.hot_threshold, config.hot_window, config.hot_ttl)
+        # runs CPU heavy per-value work, the loop's default one if None
+        self.executor = executor
+        self._tasks: Set[asyncio.Future] = set()
+        self._sync_from = 0
+
+    async def start(self, bootstrap: Optional[List[Node]] = None,
+                    transport: Optional[asyncio.DatagramTransport] = None,
+                    trace: Optional[TraceWriter] = None):
+        config = self.config
+        if transport is None:
+            self.rpc = await rpc.start(
+                self.node, self.update_routing_table, config.timeout,
+                config.timer_resolution, config.slow_callback)
+        else:
+            self.rpc = rpc.attach(
+                self.node, transport, self.update_routing_table,
+                config.timeout, config.timer_resolution,
+                config.slow_callback)
+        self.rpc.trace = trace
+        if config.monitor_interval:
+            self.monitor = LoopMonitor(
+                self.rpc.loop, config.monitor_interval, config.slow_callback)
+            self.monitor.start()
+        # keys of copies of hot values with their expiry
+        self.cached = TimerWheel(
+            self.rpc.loop, self._uncache, config.timer_resolution)
         register = self.rpc.register
 
+        def check_space(key: ID) -> None:
+            if key not in self.storage and config.max_keys is not None \
+                    and len(self.storage) >= config.max_keys:
+                raise StorageFull(f'{len(self.storage)} keys stored')
+
         @register
         def ping() -> str:
             return 'pong'
 
         @register
-        def store(key: ID, value: bytes) -> None:
-            self.storage[key] = value
+        def store(key: ID, value: Value) -> None:
+            check_space(key)
+            self.store_local(key, value)
+            self.cached.discard(key)
+
+        @register
+        def cache(key: ID, value: Value, ttl: float) -> None:
+            if key in self.storage and key not in self.cached:
+                return  # a replica already
+            check_space(key)
+            self.store_local(key, value)
+            self.cached.add(key, ttl)
 
         @register
         def find_node(id: ID) -> List[Node]:
             return self.get_closest_nodes(id)
 
         @register
-        def find_value(id: ID) -> Union[List[Node], bytes]:
+        def find_value(id: ID) -> Tuple[List[Node], Optional[Value]]:
             try:
-                return self.storage[id]
+                value = self.storage[id]
             except KeyError:
-                return find_node(id)
+                return find_node(id), None
+            if self.hot is not None and id not in self.cached and \
+                    self.hot.hit(id, self.rpc.loop.time()):
+                self._spawn(self._spread(id))
+            return [], value
+
+        @register
+        def sync(lo: ID, hi: ID, summary: BloomFilter) -> BloomFilter:
+            node = rpc.caller.get()
+            # as many keys as the requester summarizes at most, more would
+            # saturate the filter; the requester then pushes some keys we
+            # have, which are ignored
+            keys = self.storage.range(lo, hi, config.sync_chunk)
+            self._hand_off([node], self._responsible(
+                node, self._missing(keys, summary)))
+            return self._summarize(keys, summary.seed)
+
+        if config.sync_interval:
+            self._spawn(self._anti_entropy())
 
         # join the network
         if bootstrap is None:
             return
 
-        tasks = (self.rpc.find_node(node.addr, self.node.id)
+        tasks = (self.call(node, 'find_node', self.node.id)
                  for node in bootstrap)
         res = await asyncio.gather(*tasks, return_exceptions=True)
         for idx, new_nodes in enumerate(res):
@@ -129,6 +301,34 @@ class Server:
     def __repr__(self):
         return f'<Kademlia ID={self.node.id}>'
 
+    def health(self) -> Dict[str, Any]:
+        """Loop lag and RPC handler times in ms, hot keys and copies cached.
+        """
+        return {
+            'loop_lag': self.monitor.lag.summary() if self.monitor else {},
+            'handlers': {func: times.summary() for func, times
+                         in self.rpc.handler_times.items()},
+            'hot_keys': {} if self.hot is None else {
+                repr(key): {'hits': hot.hits, 'fanout': hot.fanout}
+                for key, hot in self.hot.keys.items()},
+            'cached': len(self.cached),
+        }
+
+    async def call(self, node: Node, func: str, *args):
+        """Call an RPC on the node, recording its round-trip time."""
+        start = self.rpc.loop.time()
+        try:
+            res = await self.rpc.call(node.addr, func, *args)
+        except asyncio.TimeoutError:
+            if self.alpha is not None:
+                self.alpha.on_timeout()
+            raise
+        rtt = self.rpc.loop.time() - start
+        if self.alpha is not None:
+            self.alpha.on_reply(rtt, self.rtt.get(node))
+        self.rtt.update(node, rtt)
+        return res
+
     async def update_routing_table(self, new: Node):
         if new == self.node:
             log.debug('Ignoring this node.')
@@ -143,73 +343,377 @@ class Server:
 
         if not bucket.full():
             bucket.append(new)
+            self._hand_off_to(new, self.storage.branch(new.id, self.node.id))
             return
 
-        if bucket.covers(self.node):
-            mask = (1 << self.node_level) & self.node.id
+        if bucket.covers(self.node) and \
+                len(self.routing_table) < self.config.max_buckets:
             self.node_level += 1
             self.routing_table.remove(bucket)
-            self.routing_table += bucket.divide(mask)
+            halves = bucket.divide()
+            self.routing_table += halves
+            # all contacts of the far half are closer to its keys than us
+            far = halves[1] if halves[0].covers(self.node) else halves[0]
+            keys = self.storage.range(*far.range)
+            for node in far:
+                self._hand_off_to(node, keys)
             await self.update_routing_table(new)
             return
 
         oldest = bucket[0]
         try:
-            await self.rpc.ping(oldest.addr)
-        except asyncio.TimeoutError:
-            bucket.remove(oldest)
+            await self.call(oldest, 'ping')
+        except (asyncio.TimeoutError, rpc.RpcError):
+            evicted = oldest
+        else:
+            # Replace the slowest contact if the new node is known to be
+            # much closer in the network. Its RTT is only known if we have
+            # called it before; pinging it here could ping-pong forever.
+            if not self.config.proximity or new not in self.rtt:
+                return  # the new node is dropped
+            evicted = max(bucket, key=lambda n: self.rtt.get(n, 0))
+            if self.rtt.get(evicted, 0) < \
+                    self.rtt.get(new) * self.config.proximity_ratio:
+                return
+        if evicted in bucket and new not in bucket:
+            bucket.remove(evicted)
             bucket.append(new)
+            self._hand_off_to(new, self.storage.branch(new.id, self.node.id))
 
-        # the new node is dropped
+    def _hand_off_to(self, node: Node, keys: List[ID]) -> None:
+        """Hand the keys the contact is a replica of off to it.
+
+        Only keys we were a replica of before knowing the contact are handed
+        off, copies kept by writers would spread further at every join.
+        Contacts are added under the ID and address they claim, so keys only
+        go to one that answered a call of ours.
+        """
+        keys = self._responsible(self.node, self._responsible(node, keys),
+                                 ignore=node)
+        if keys:
+            self._spawn(self._hand_off_checked(node, keys))
+
+    async def _hand_off_checked(self, node: Node, keys: List[ID]) -> None:
+        if node not in self.rtt:
+            try:
+                await self.call(node, 'ping')
+            except (asyncio.TimeoutError, rpc.RpcError):
+                return
+        self._hand_off([node], keys)
+
+    def _hand_off(self, nodes: List[Node], keys: List[ID]) -> None:
+        """Copy the values of the keys to nodes closer to them than us."""
+        keys = [key for key in keys if key not in self.cached]
+        if not nodes or not keys:
+            return
+        log.debug(f'Handing {len(keys)} keys off to {len(nodes)} nodes')
+        self._spawn(self._push(nodes, keys))
+
+    def _spawn(self, coro: Awaitable) -> None:
+        """Run a background task until it is done or the server closes."""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _push(self, nodes: List[Node], keys: List[ID]) -> None:
+        for i in range(0, len(keys), HANDOFF_BATCH):
+            batch = [(key, self.storage[key])
+                     for key in keys[i:i + HANDOFF_BATCH]
+                     if key in self.storage]
+            await asyncio.gather(
+                *(self.call(node, 'store', key, value)
+                  for key, value in batch for node in nodes),
+                return_exceptions=True)
+
+    def _summarize(self, keys: List[ID], seed: int) -> BloomFilter:
+        return BloomFilter.build(
+            ((key, self.storage[key].version) for key in keys), len(keys),
+            self.config.sync_filter_bits, seed)
+
+    def _missing(self, keys: List[ID], summary: BloomFilter) -> List[ID]:
+        """Keys whose stored version is not in the peer's summary."""
+        return [key for key in keys
+                if (key, self.storage[key].version) not in summary]
+
+    def _responsible(self, node: Node, keys: List[ID],
+                     ignore: Optional[Node] = None) -> List[ID]:
+        """Keys the node is one of the k closest known nodes to."""
+        # Another node is closer to a key iff the key differs from `node`
+        # at the highest bit the two nodes differ at, so the other nodes
+        # are counted per such bit rather than compared to every key.
+        others: Dict[int, int] = {}
+        for other in chain(*self.routing_table, [self.node]):
+            if other != node and other != ignore:
+                bit = 1 << ((other.id ^ node.id).bit_length() - 1)
+                others[bit] = others.get(bit, 0) + 1
+        ksize = self.config.ksize
+        if sum(others.values()) < ksize:
+            return keys
+        responsible = []
+        for key in keys:
+            distance = node.id ^ key
+            closer = 0
+            for bit, count in others.items():
+                if distance & bit:
+                    closer += count
+                    if closer >= ksize:
+                        break
+            else:
+                responsible.append(key)
+        return responsible
+
+    async def sync_with(self, node: Node) -> int:
+        """Run one anti-entropy round with a replica neighbour.
+
+        Both sides summarize the next `sync_chunk` of our keys in a Bloom
+        filter and push each other the values missing from the other's
+        summary, if the other is one of their replicas. Returns the number
+        of values pushed by us.
+        """
+        lo = self._sync_from
+        chunk = self.config.sync_chunk
+        keys = self.storage.range(lo, 2 ** 160, chunk + 1)
+        hi: int = 2 ** 160
+        if len(keys) > chunk:
+            hi = keys.pop()
+        self._sync_from = hi % 2 ** 160  # wrap around after the last chunk
+
+        seed = random.getrandbits(63)
+        theirs = await self.call(node, 'sync', ID(lo), ID(hi),
+                                 self._summarize(keys, seed))
+        missing = self._responsible(node, self._missing(keys, theirs))
+        self._hand_off([node], missing)
+        return len(missing)
+
+    async def _anti_entropy(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.sync_interval)
+            neighbours = self.get_closest_nodes(self.node.id)
+            if not neighbours:
+                continue
+            try:
+                await self.sync_with(random.choice(neighbours))
+            except (asyncio.TimeoutError, rpc.RpcError) as exc:
+                log.info(f'Anti-entropy round failed: {exc!r}')
+
+    async def _spread(self, key: ID) -> None:
+        """Cache a hot value on the contacts closest to it after the replicas.
+
+        Lookups for the key converge through them, so reads are answered a
+        hop or more before reaching the replicas.
+        """
+        value = self.storage.get(key)
+        if value is None or self.hot is None:
+            return
+        ksize, fanout = self.config.ksize, self.config.hot_fanout
+        nodes = nsmallest(ksize + fanout, chain(*self.routing_table),
+                          xor_key(key))[ksize:]
+        res = await asyncio.gather(
+            *(self.call(node, 'cache', key, value, self.config.hot_ttl)
+              for node in nodes), return_exceptions=True)
+        hot = self.hot.keys.get(key)
+        if hot is not None:
+            hot.fanout = sum(not isinstance(r, Exception) for r in res)
+        log.info(f'Cached hot key {key} on {len(nodes)} nodes')
+
+    def _uncache(self, keys: List[ID]) -> None:
+        for key in keys:
+            self.storage.pop(key, None)
 
     def get_closest_nodes(self, id: ID) -> List[Node]:
-        return nsmallest(ksize, chain(*self.routing_table), xor_key(id))
+        return nsmallest(self.config.ksize, chain(*self.routing_table),
+                         xor_key(id))
 
-    async def _lookup_node(self, id: ID, rpc_func: str) -> List[Node]:
-        """Locate the k closest nodes to the given node ID.
+    async def lookup(self, id: ID, rpc_func: str = 'find_node'
+                     ) -> AsyncGenerator[LookupProgress, None]:
+        """Iteratively locate the nodes closest to the given ID.
+
+        Yields a `LookupProgress` for every reply and every failed peer.
+        In-flight RPCs are cancelled as soon as the iterator is closed.
         """
         xor = xor_key(id)
+        ksize = self.config.ksize
         nodes = self.get_closest_nodes(id)
-        queue = LookupQueue(xor, nodes)
+        queue = LookupQueue(
+            xor, nodes, ksize, self.rtt.get if self.config.proximity else None,
+            self.config.proximity_slack)
+        seen = set(nodes)
         queried = set()
+        # not added back when named again by later replies
+        failed: Set[Node] = set()
+        events: asyncio.Queue = asyncio.Queue()
 
         async def query():
             while not queue.empty():
-                node = await queue.get()
+                node = queue.get_nowait()
+                if node in queried:
+                    continue
                 queried.add(node)
-                new_nodes = await self.rpc.call(node.addr, rpc_func, id)
-                if isinstance(new_nodes, bytes):
-                    raise ValueFound(new_nodes)
-                for node in new_nodes:
-                    if node == self.node:
+                try:
+                    res = await self.call(node, rpc_func, id)
+                except (asyncio.TimeoutError, rpc.RpcError):
+                    seen.discard(node)
+                    failed.add(node)
+                    events.put_nowait(LookupProgress(
+                        node, nsmallest(ksize, seen, key=xor), failed=True))
+                    continue
+                if rpc_func == 'find_value':
+                    res, value = res
+                    if value is not None:
+                        events.put_nowait(LookupProgress(
+                            node, nsmallest(ksize, seen, key=xor), value))
                         continue
-                    if node.id == id:
-                        raise NodeFound(node)
-                    if node not in queried:
-                        queue.put_nowait(node)
-
+                for new in res:
+                    if new != self.node and new not in seen and \
+                            new not in failed:
+                        seen.add(new)
+                        queue.put_nowait(new)
+                events.put_nowait(
+                    LookupProgress(node, nsmallest(ksize, seen, key=xor)))
+
+        asize = self.config.asize if self.alpha is None else int(self.alpha)
+        workers = [asyncio.create_task(query()) for _ in range(asize)]
+        done = asyncio.gather(*workers)
+
+        def finished(fut: asyncio.Future) -> None:
+            _ignore_result(fut)  # cancelled when the iterator is closed
+            events.put_nowait(None)
+
+        done.add_done_callback(finished)
         try:
-            await asyncio.gather(*(query() for _ in range(asize)))
-        except NodeFound as exc:
-            return [exc.args[0]]
-        return nsmallest(ksize, queried, key=xor)
-
-    async def set(self, key: ID, value: bytes) -> None:
+            while True:
+                progress = await events.get()
+                if progress is None:
+                    break
+                yield progress
+            await done
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _lookup_node(self, id: ID) -> List[Node]:
+        """Locate the k closest nodes to the given node ID.
+        """
+        closest = []
+        lookup = self.lookup(id)
+        try:
+            async for progress in lookup:
+                closest = progress.closest
+                if closest and closest[0].id == id:
+                    return closest[:1]
+        finally:
+            await lookup.aclose()
+        return closest
+
+    async def _offload(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def _encode(self, data: bytes) -> Value:
+        if self.codec == codec.NONE or \
+                len(data) < self.config.compress_threshold:
+            return Value(data)
+        packed, used = await self._offload(codec.compress, data, self.codec)
+        return Value(packed, codec=used)
+
+    async def _decode(self, value: Value) -> Value:
+        if value.codec == codec.NONE:
+            return value
+        data = await self._offload(codec.decompress, value.data, value.codec)
+        return Value(data, value.version)
+
+    def store_local(self, key: ID, value: Value) -> bool:
+        """Store the value unless a newer version is already stored."""
+        old = self.storage.get(key)
+        if old is not None and not value.newer_than(old):
+            return False
         self.storage[key] = value
-        nodes = await self._lookup_node(key, 'find_node')
-        await asyncio.gather(
-            *(self.rpc.store(node.addr, key, value) for node in nodes))
+        return True
 
-    async def get(self, key: ID) -> bytes:
-        try:
-            return self.storage[key]
-        except KeyError:
+    async def set(self, key: ID, value: bytes,
+                  version: Optional[int] = None) -> None:
+        """Store the value on the k closest nodes.
+
+        Returns once `write_quorum` of them acknowledged, the remaining
+        stores finish in the background. Raises QuorumError if fewer did.
+
+        Both quorums are capped at the number of replicas the lookup finds,
+        so a network smaller than the quorum still accepts writes and
+        reads, and a lone node only stores its own copy. `get()` counts
+        that copy as a replica.
+        """
+        item = await self._encode(value)
+        if version is not None:
+            item.version = version
+        self.store_local(key, item)
+        self.cached.discard(key)
+        nodes = await self._lookup_node(key)
+        stores = [asyncio.ensure_future(self.call(node, 'store', key, item))
+                  for node in nodes]
+        await wait_quorum(stores, min(self.config.write_quorum, len(stores)))
+
+    async def get(self, key: ID, local: bool = True) -> bytes:
+        """Return the newest of the first `read_quorum` values found.
+
+        Raises KeyError if no value is found and QuorumError if fewer than
+        `read_quorum` are, capped as in `set()`. With `local` false a stored
+        copy is not counted, the value is always looked up in the network.
+        """
+        quorum = self.config.read_quorum
+        newest: Optional[Value] = None
+        replies = 0
+        if local and key in self.storage:
+            newest = self.storage[key]
+            replies = 1
+        own = replies
+        closest: List[Node] = []
+        if replies < quorum:
+            lookup = self.lookup(key, 'find_value')
             try:
-                await self._lookup_node(key, 'find_value')
-            except ValueFound as exc:
-                return exc.args[0]
-            else:
-                raise KeyError(f'key {key} not found')
+                async for progress in lookup:
+                    closest = progress.closest
+                    value = progress.value
+                    if value is None:
+                        continue
+                    if newest is None or value.newer_than(newest):
+                        newest = value
+                    replies += 1
+                    if replies >= quorum:
+                        break
+            finally:
+                await lookup.aclose()
+        if newest is None:
+            raise KeyError(f'key {key} not found')
+        quorum = min(quorum, own + len(closest))
+        if replies < quorum:
+            raise QuorumError(f'only {replies} of {quorum} required values')
+        return (await self._decode(newest)).data
+
+    async def get_all(self, key: ID) -> AsyncIterator[Value]:
+        """Yield the values stored for the key as replicas reply."""
+        values = self._replicas(key)
+        try:
+            async for value in values:
+                yield await self._decode(value)
+        finally:
+            await values.aclose()
+
+    async def _replicas(self, key: ID) -> AsyncGenerator[Value, None]:
+        """Like `get_all()`, but yields values as stored."""
+        if key in self.storage:
+            yield self.storage[key]
+        lookup = self.lookup(key, 'find_value')
+        try:
+            async for progress in lookup:
+                if progress.value is not None:
+                    yield progress.value
+        finally:
+            await lookup.aclose()
 
     async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        if self.monitor is not None:
+            self.monitor.close()
+        self.cached.close()
         self.rpc.close()
@@ -0,0 +1,135 @@
+"""Replay of a datagram trace into a local node behind `kad replay`.
+
+The datagrams the traced node received are fed to a fresh `Server` with
+the same ID over a transport that only counts what the node sends back,
+either as fast as possible or at the recorded pace. Identical input makes
+the throughput and per-stage timings of two versions comparable.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, BinaryIO, Dict, Iterable, Optional
+
+from .config import Config
+from .node import Addr
+from .protocol import Server, _ignore_result
+from .rpc import Message
+from .trace import SENT, Record, read_trace
+
+
+class ReplayTransport(asyncio.DatagramTransport):
+    def __init__(self, addr: Addr) -> None:
+        super().__init__({'sockname': addr})
+        self.packets = 0
+        self.bytes = 0
+        self._closing = False
+
+    def set_protocol(self, protocol: Any) -> None:
+        self._protocol = protocol
+
+    def get_protocol(self) -> Any:
+        return self._protocol
+
+    def sendto(self, data: Any, addr: Any = None) -> None:
+        self.packets += 1
+        self.bytes += len(data)
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self) -> None:
+        self._closing = True
+
+    def abort(self) -> None:
+        self.close()
+
+
+def _last_call_id(records: Iterable[Record]) -> int:
+    last = -1
+    for record in records:
+        if record.direction == SENT:
+            msg_id, is_call = Message.peek(record.data)
+            if is_call:
+                last = max(last, msg_id)
+    return last
+
+
+async def replay(f: BinaryIO, speed: Optional[float] = None,
+                 config: Optional[Config] = None) -> Dict[str, Any]:
+    """Feed the received datagrams of a trace to a new node.
+
+    Calls the traced node sent are registered as pending, so the replies
+    to them in the trace are handled rather than dropped as unknown.
+
+    `speed` scales the recorded pace, 1 is real time and None as fast as
+    the node keeps up. Returns throughput and timings in milliseconds. The
+    trace is read twice, `f` must be seekable.
+    """
+    if config is None:
+        # leaves the node alone with the replayed traffic
+        config = Config(sync_interval=0, monitor_interval=0, timeout=1)
+    # Calls of the replayed node must not reuse the IDs of the traced one,
+    # whose replies are in the trace. IDs restart at 0 in every process.
+    offset = f.tell()
+    _, records = read_trace(f)
+    Message.id_gen = max(Message.id_gen, _last_call_id(records) + 1)
+    f.seek(offset)
+    traced, records = read_trace(f)
+    transport = ReplayTransport(traced.addr)
+    server = Server(traced.addr, traced.id, config)
+    await server.start(transport=transport)
+    loop = asyncio.get_running_loop()
+
+    count = size = 0
+    start = time.perf_counter()
+    begin = loop.time()
+    try:
+        for record in records:
+            if record.direction == SENT:
+                msg_id, is_call = Message.peek(record.data)
+                if is_call and msg_id not in server.rpc.requests:
+                    fut = loop.create_future()
+                    fut.add_done_callback(_ignore_result)
+                    server.rpc.requests[msg_id] = fut
+                continue
+            if speed is not None:
+                delay = begin + record.time / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            server.rpc.datagram_received(record.data, record.addr)
+            count += 1
+            size += len(record.data)
+            # let the handler of the request run before the next one
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+    finally:
+        await server.close()
+
+    rpc = server.rpc
+    return {
+        'datagrams': count,
+        'bytes': size,
+        'elapsed': elapsed,
+        'throughput': count / elapsed if elapsed else 0.,
+        'sent': transport.packets,
+        'stages_ms': {
+            'decode': rpc.decode_times.summary(),
+            'encode': rpc.encode_times.summary(),
+            **{f'{func}()': times.summary()
+               for func, times in rpc.handler_times.items()},
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['datagrams']} datagrams ({report['bytes']} bytes) in "
+          f"{report['elapsed']:.2f}s, {report['throughput']:.1f}/s, "
+          f"{report['sent']} sent")
+    for stage, summary in report['stages_ms'].items():
+        if not summary['count']:
+            continue
+        print(f"  {stage:>12}: n={summary['count']} "
+              f"mean={summary['mean']:.3f} p50={summary['p50']:.3f} "
+              f"p99={summary['p99']:.3f} max={summary['max']:.3f} (ms)")
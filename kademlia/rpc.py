@@ -2,17 +2,23 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from asyncio import Future, Handle, AbstractEventLoop
+import time
+from asyncio import Future, AbstractEventLoop
 from asyncio.transports import BaseTransport, DatagramTransport
+from collections import defaultdict
+from contextvars import ContextVar
 from dataclasses import dataclass, field
 from functools import partial
-from typing import Callable, Dict, Union, Text, Tuple, Optional, Generic, \
-    TypeVar, ClassVar, cast, get_type_hints, Awaitable
+from typing import Callable, Dict, List, Union, Text, Tuple, Optional, \
+    Generic, Type, TypeVar, ClassVar, cast, get_type_hints, Awaitable
 
 import msgpack
 
+from .monitor import Histogram
 from .node import Node, Addr
 from .serializer import dumps, loads
+from .timer import TimerWheel
+from .trace import TraceWriter
 
 A = TypeVar('A')
 R = TypeVar('R')
@@ -31,6 +37,54 @@ class Result(Generic[R]):
     value: R
 
 
+class RpcError(Exception):
+    """Base class of the exceptions raised for error replies."""
+
+
+# Error codes are indexes into this tuple. A handler exception is sent as
+# the code of its nearest listed base class plus a short message.
+# TimeoutError is left out: it is asyncio.TimeoutError since Python 3.11,
+# and a remote one must not look like the call itself timing out.
+ERROR_TYPES: Tuple[Type[Exception], ...] = (
+    Exception, ValueError, TypeError, KeyError, LookupError,
+    NotImplementedError, OSError, FileNotFoundError, PermissionError,
+    MemoryError, OverflowError,
+)
+_ERROR_CODES = {tp: code for code, tp in enumerate(ERROR_TYPES)}
+_REMOTE_TYPES: Dict[int, Type[RpcError]] = {}
+_MAX_MESSAGE = 200
+
+
+@dataclass
+class Error:
+    code: int
+    message: str
+
+    @classmethod
+    def from_exception(cls, exc: BaseException) -> Error:
+        code = next((_ERROR_CODES[tp] for tp in type(exc).__mro__
+                     if tp in _ERROR_CODES), 0)
+        return cls(code, f'{type(exc).__name__}: {exc}'[:_MAX_MESSAGE])
+
+    def to_exception(self) -> RpcError:
+        """Make an exception that is both an RpcError and the mapped type.
+        """
+        try:
+            tp = _REMOTE_TYPES[self.code]
+        except KeyError:
+            if 0 < self.code < len(ERROR_TYPES):
+                base = ERROR_TYPES[self.code]
+                tp = type(f'Remote{base.__name__}', (RpcError, base), {})
+            else:
+                tp = RpcError
+            _REMOTE_TYPES[self.code] = tp
+        return tp(self.message)
+
+
+# pseudo function name of error replies, never a valid identifier
+ERROR_FUNC = '!error'
+
+
 @dataclass
 class Message(Generic[A, R]):
     id: int
@@ -51,6 +105,16 @@ class Message(Generic[A, R]):
     def new_result(cls, id: int, func: str, result: Result) -> Message:
         return Message(id, False, func, result)
 
+    @classmethod
+    def new_error(cls, id: int, error: Error) -> Message:
+        return Message(id, False, ERROR_FUNC, Result(False, error))
+
+    @staticmethod
+    def peek(data: bytes) -> Tuple[int, bool]:
+        """Return the ID and kind of a message that failed to decode."""
+        _, (id, is_call, *_) = msgpack.loads(data, raw=False)
+        return id, is_call
+
     @classmethod
     def _infer_union(cls, is_call: bool):
         return {'data': Call if is_call else Result}
@@ -92,19 +156,31 @@ class Function:
 
 
 log = logging.getLogger(__name__)
+# the node whose request is being handled, with the address the request
+# came from rather than the one it claims
+caller: ContextVar[Node] = ContextVar('caller')
 RpcCallback = Optional[Callable[[Node], Awaitable]]
 
 
 class RpcProtocol(asyncio.DatagramProtocol):
     def __init__(self, loop: AbstractEventLoop, caller: Node,
-                 on_rpc: RpcCallback, timeout: float) -> None:
+                 on_rpc: RpcCallback, timeout: float,
+                 resolution: float = .1, slow_callback: float = .1) -> None:
         self.loop = loop
         self.caller = caller
         self.on_rpc = on_rpc
         self.timeout = timeout
+        # decoding, handling or encoding a request for longer is logged
+        self.slow_callback = slow_callback
 
         self.funcs: Dict[str, Function] = {}
-        self.requests: Dict[int, Tuple[Future, Handle]] = {}
+        self.handler_times: Dict[str, Histogram] = defaultdict(Histogram)
+        self.decode_times = Histogram()
+        self.encode_times = Histogram()
+        # records every datagram received and sent if set
+        self.trace: Optional[TraceWriter] = None
+        self.requests: Dict[int, Future] = {}
+        self.timeouts = TimerWheel(loop, self.timed_out, resolution)
 
     def register(self, func: Callable) -> Callable:
         self.funcs[func.__name__] = Function(func)
@@ -114,18 +190,32 @@ class RpcProtocol(asyncio.DatagramProtocol):
         msg = Message.new_call(self.caller, func_name, args)
 
         on_finished = self.loop.create_future()
-        on_timeout = self.loop.call_later(
-            self.timeout, self.timed_out, msg.id)
-        self.requests[msg.id] = (on_finished, on_timeout)
+        on_finished.add_done_callback(partial(self._finished, msg.id))
+        self.requests[msg.id] = on_finished
+        self.timeouts.add(msg.id, self.timeout)
 
         log.debug(f'Sending RPC request #{msg.id} {func_name}() to {addr}')
-        self.transport.sendto(msg.to_bytes(), addr)
+        self._sendto(msg.to_bytes(), addr)
         return on_finished
 
-    def timed_out(self, msg_id: int) -> None:
-        log.warning(f'RPC #{msg_id} timed out')
-        on_finished = self.requests.pop(msg_id)[0]
-        on_finished.set_exception(asyncio.TimeoutError)
+    def _sendto(self, data: bytes, addr: Addr) -> None:
+        if self.trace is not None:
+            self.trace.sent(data, addr)
+        self.transport.sendto(data, addr)
+
+    def _finished(self, msg_id: int, on_finished: Future) -> None:
+        # Runs on response, timeout and cancellation by the caller alike.
+        if self.requests.get(msg_id) is on_finished:
+            del self.requests[msg_id]
+            self.timeouts.discard(msg_id)
+
+    def timed_out(self, msg_ids: List[int]) -> None:
+        for msg_id in msg_ids:
+            on_finished = self.requests.get(msg_id)
+            if on_finished is None or on_finished.done():
+                continue
+            log.warning(f'RPC #{msg_id} timed out')
+            on_finished.set_exception(asyncio.TimeoutError())
 
     def __getattr__(self, func: str):
         if func.startswith('__'):
@@ -136,7 +226,7 @@ class RpcProtocol(asyncio.DatagramProtocol):
 
         return f
 
-    async def do_call(self, call: Call) -> Result:
+    async def do_call(self, call: Call, size: int = 0) -> Result:
         try:
             func = self.funcs[call.func].func
         except KeyError:
@@ -145,63 +235,139 @@ class RpcProtocol(asyncio.DatagramProtocol):
         if self.on_rpc is not None:
             await self.on_rpc(call.caller)
 
+        is_async = asyncio.iscoroutinefunction(func)
+        start = time.perf_counter()
         try:
             res = func(*call.args)
-            if asyncio.iscoroutinefunction(func):
+            if is_async:
                 res = await res
         except Exception as exc:
             return Result(False, exc)
         else:
             return Result(True, res)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.handler_times[call.func].add(elapsed)
+            # coroutines may have been waiting rather than blocking the loop
+            if elapsed > self.slow_callback and not is_async:
+                log.warning(f'RPC handler {call.func}() took '
+                            f'{elapsed * 1e3:.0f} ms on a {size} byte '
+                            f'request')
 
     def connection_made(self, transport: BaseTransport) -> None:
         self.transport = cast(DatagramTransport, transport)
 
     def close(self) -> None:
+        self.timeouts.close()
+        for on_finished in self.requests.values():
+            on_finished.cancel()
         self.transport.close()
 
     def _infer_generic(self, func: str):
-        func = self.funcs[func]
-        return {A: func.args_type, R: func.return_type}
+        if func == ERROR_FUNC:
+            return {R: Error}
+        try:
+            function = self.funcs[func]
+        except KeyError:
+            # left undecoded, do_call() replies with an error
+            return {A: type(None), R: type(None)}
+        return {A: function.args_type, R: function.return_type}
 
-    async def handle_request(self, msg: Message, addr: Addr):
+    async def handle_request(self, msg: Message, addr: Addr, size: int = 0):
         log.debug(f'Received RPC request #{msg.id}')
-        res = Message.new_result(msg.id, msg.data.func, await self.do_call(msg.data))
+        # handle_request() runs in a task of its own, with its own context
+        caller.set(Node(msg.data.caller.id, addr))
+        result = await self.do_call(msg.data, size)
+        if result.ok:
+            start = time.perf_counter()
+            try:
+                data = Message.new_result(
+                    msg.id, msg.data.func, result).to_bytes()
+            except Exception as exc:
+                log.exception(f'Failed to encode RPC response #{msg.id}')
+                data = Message.new_error(
+                    msg.id, Error.from_exception(exc)).to_bytes()
+            elapsed = time.perf_counter() - start
+            self.encode_times.add(elapsed)
+            if elapsed > self.slow_callback:
+                log.warning(f'Encoding the {len(data)} byte response of '
+                            f'{msg.data.func}() took {elapsed * 1e3:.0f} ms')
+        else:
+            data = Message.new_error(
+                msg.id, Error.from_exception(result.value)).to_bytes()
         log.debug(f'Sending RPC response #{msg.id} back')
-        self.transport.sendto(res.to_bytes(), addr)
+        self._sendto(data, addr)
+
+    def reject(self, data: bytes, addr: Addr, exc: Exception) -> None:
+        """Reply with an error to a request that could not be decoded."""
+        try:
+            msg_id, is_call = Message.peek(data)
+        except Exception:
+            log.warning(f'Received invalid RPC request/response: '
+                        f'{data[:8]!r}...')
+            return
+        if is_call:
+            log.debug(f'Rejecting RPC request #{msg_id}: {exc}')
+            error = Message.new_error(msg_id, Error.from_exception(exc))
+            self._sendto(error.to_bytes(), addr)
+        else:
+            log.warning(f'Received invalid RPC response #{msg_id}: {exc}')
 
     def handle_response(self, msg: Message):
         log.debug(f'Received RPC response #{msg.id} '
                   f"{'OK' if msg.data.ok else 'FAIL'}")
-        try:
-            on_call_finished, on_timeout = self.requests.pop(msg.id)
-        except KeyError:
+        on_call_finished = self.requests.get(msg.id)
+        if on_call_finished is None or on_call_finished.done():
             log.warning(f'RPC #{msg.id} not found')
             return
-        on_timeout.cancel()
         if msg.data.ok:
             on_call_finished.set_result(msg.data.value)
         else:
-            on_call_finished.set_exception(msg.data.value)
+            on_call_finished.set_exception(msg.data.value.to_exception())
 
     def datagram_received(self, data: Union[bytes, Text], addr: Addr) -> None:
         assert isinstance(data, bytes)
+        if self.trace is not None:
+            self.trace.received(data, addr)
+        start = time.perf_counter()
         try:
             msg = Message.from_bytes(data, self._infer_generic)
-        except msgpack.UnpackException:
-            log.warning(f'Received invalid RPC request/response: {data[:8]}...')
+        except Exception as exc:
+            self.reject(data, addr, exc)
             return
+        elapsed = time.perf_counter() - start
+        self.decode_times.add(elapsed)
+        if elapsed > self.slow_callback:
+            what = f'{msg.data.func}() request' if msg.is_call \
+                else 'response'
+            log.warning(f'Decoding a {len(data)} byte RPC {what} took '
+                        f'{elapsed * 1e3:.0f} ms')
         if msg.is_call:
-            asyncio.create_task(self.handle_request(msg, addr))
+            asyncio.create_task(self.handle_request(msg, addr, len(data)))
         else:
             self.handle_response(msg)
 
 
 async def start(caller: Node, on_rpc: RpcCallback = None,
-                timeout: float = 30) -> RpcProtocol:
+                timeout: float = 30, resolution: float = .1,
+                slow_callback: float = .1) -> RpcProtocol:
     loop = asyncio.get_running_loop()
     _, protocol = await loop.create_datagram_endpoint(
-        lambda: RpcProtocol(loop, caller, on_rpc, timeout),
+        lambda: RpcProtocol(loop, caller, on_rpc, timeout, resolution,
+                            slow_callback),
         local_addr=caller.addr
     )
     return cast(RpcProtocol, protocol)
+
+
+def attach(caller: Node, transport: asyncio.DatagramTransport,
+           on_rpc: RpcCallback = None, timeout: float = 30,
+           resolution: float = .1,
+           slow_callback: float = .1) -> RpcProtocol:
+    """Run the protocol over an existing transport, e.g. a simulated one."""
+    loop = asyncio.get_running_loop()
+    protocol = RpcProtocol(loop, caller, on_rpc, timeout, resolution,
+                           slow_callback)
+    transport.set_protocol(protocol)
+    protocol.connection_made(transport)
+    return protocol
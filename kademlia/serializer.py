@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import (Any, get_type_hints, Type, TypeVar, Union, Callable,
                     Optional, _GenericAlias)
 
@@ -9,14 +10,32 @@ _IMMUTABLE = {str, bytes, int, float, bool, type(None)}
 _HEAPTYPE = 1 << 9
 T = TypeVar('T')
 _EMPTY = object()
+# evaluating string annotations dominated decoding, the results are shared
+# and must not be modified
+_type_hints = lru_cache(maxsize=1024)(get_type_hints)
+# msgpack ints are limited to 64 bits, larger ones (e.g. IDs) use an ext type
+_BIGINT = 1
+_INT_RANGE = range(-2 ** 63, 2 ** 64)
+
+
+def _pack_bigint(num: int) -> msgpack.ExtType:
+    size = (num.bit_length() + 8) // 8
+    return msgpack.ExtType(_BIGINT, num.to_bytes(size, 'little', signed=True))
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == _BIGINT:
+        return int.from_bytes(data, 'little', signed=True)
+    return msgpack.ExtType(code, data)
 
 
 def _reduce(obj):
     if isinstance(obj, BaseException):
-        print('****', obj)
-        raise obj
+        raise TypeError(f'cannot serialize exception {obj!r}')
     tp = type(obj)
     if tp in _IMMUTABLE:
+        if tp is int and obj not in _INT_RANGE:
+            return _pack_bigint(obj)
         return obj
     if tp in (list, tuple, frozenset):
         return tuple(_reduce(i) for i in obj)
@@ -66,11 +85,11 @@ class Decoder():
     def __init__(self, infer_generic, infer_union):
         self._infer_generic = infer_generic
         if infer_generic is not None:
-            self._infer_generic_arg = tuple(get_type_hints(infer_generic))[0]
+            self._infer_generic_arg = tuple(_type_hints(infer_generic))[0]
 
         self._infer_union = infer_union
         if infer_union is not None:
-            self._infer_union_arg = tuple(get_type_hints(infer_union))[0]
+            self._infer_union_arg = tuple(_type_hints(infer_union))[0]
 
         self._generic_values = {}
         self._union_values = {}
@@ -116,6 +135,11 @@ class Decoder():
         elif name == 'Tuple':
             if len(types) == 2 and types[1] is ...:
                 return tuple(self.decode(types[0], item) for item in value)
+            if types == ((),):
+                types = ()  # Tuple[()] before Python 3.11
+            if len(types) != len(value):
+                raise TypeError(f'expected {len(types)} items, '
+                                f'got {len(value)}')
             return tuple(self.decode(tp, item)
                          for tp, item in zip(types, value))
         elif name == 'Dict':
@@ -144,7 +168,7 @@ class Decoder():
                 arg = self.decode(tp, arg)
                 break
 
-        hints = get_type_hints(cls)
+        hints = _type_hints(cls)
 
         obj = _construct(cls, arg)
         if not rest:
@@ -199,5 +223,6 @@ class Decoder():
 def loads(cls: Type[T], data: bytes,
           infer_generic: Optional[Callable] = None,
           infer_union: Optional[Callable] = None) -> T:
-    value = msgpack.loads(data, raw=False, use_list=False)
+    value = msgpack.loads(data, raw=False, use_list=False,
+                          ext_hook=_ext_hook)
     return Decoder(infer_generic, infer_union).decode(cls, value)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, MutableMapping, Optional, Set
+
+from .node import ID
+
+
+class StorageFull(MemoryError):
+    """Raised by a node refusing to store new keys beyond its limit."""
+
+
+def new_version() -> int:
+    return time.time_ns()
+
+
+@dataclass
+class Value:
+    """A stored value with the version used to resolve conflicting replicas.
+
+    Versions default to the writer's wall clock in nanoseconds, so the last
+    write wins. `codec` tells how `data` is compressed, see `codec.py`.
+    """
+    data: bytes
+    version: int = field(default_factory=new_version)
+    codec: int = 0
+
+    def newer_than(self, other: Value) -> bool:
+        return self.version > other.version
+
+
+class Storage(MutableMapping[ID, Value]):
+    """Values keyed by ID, with an ordered index of the keys.
+
+    The index answers range and prefix queries in time proportional to the
+    result instead of scanning every key. New keys are sorted into it
+    lazily and deleted ones are skipped until the next compaction.
+    """
+
+    def __init__(self) -> None:
+        self._values: Dict[ID, Value] = {}
+        self._keys: List[ID] = []
+        self._pending: List[ID] = []
+        self._deleted: Set[ID] = set()
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self._values!r})'
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self) -> Iterator[ID]:
+        return iter(self._values)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._values
+
+    def __getitem__(self, key: ID) -> Value:
+        return self._values[key]
+
+    def __setitem__(self, key: ID, value: Value) -> None:
+        if key not in self._values:
+            if key in self._deleted:
+                self._deleted.remove(key)  # still in the index
+            else:
+                self._pending.append(key)
+        self._values[key] = value
+
+    def __delitem__(self, key: ID) -> None:
+        del self._values[key]
+        self._deleted.add(key)
+
+    def _index(self) -> List[ID]:
+        if self._pending:
+            # timsort merges the sorted keys and the sorted pending run
+            self._pending.sort()
+            self._keys += self._pending
+            self._keys.sort()
+            self._pending = []
+        if len(self._deleted) > len(self._keys) // 4:
+            self._keys = [k for k in self._keys if k not in self._deleted]
+            self._deleted.clear()
+        return self._keys
+
+    def _live(self, keys: List[ID]) -> List[ID]:
+        if not self._deleted:
+            return keys
+        return [k for k in keys if k not in self._deleted]
+
+    def range(self, lo: int, hi: int,
+              limit: Optional[int] = None) -> List[ID]:
+        """Keys in [lo, hi), in order, only the first `limit` if given."""
+        keys = self._index()
+        first = bisect_left(keys, lo)
+        last = bisect_left(keys, hi, first)
+        if limit is None:
+            return self._live(keys[first:last])
+        found: List[ID] = []
+        for i in range(first, last):
+            if len(found) >= limit:
+                break
+            if keys[i] not in self._deleted:
+                found.append(keys[i])
+        return found
+
+    def prefix(self, prefix: int, bits: int, size: int = 160) -> List[ID]:
+        """Keys whose `bits` most significant bits equal `prefix`."""
+        shift = size - bits
+        return self.range(prefix << shift, (prefix + 1) << shift)
+
+    def branch(self, target: int, reference: int) -> List[ID]:
+        """Keys in `target`'s half of the subtree it shares with `reference`.
+
+        These are the keys sharing the bits above the highest differing bit
+        with both IDs and agreeing with `target` on it, so `target` is closer
+        to them than `reference` and than any node outside the subtree.
+        """
+        if target == reference:
+            return []
+        bit = (target ^ reference).bit_length() - 1
+        return self.prefix(target >> bit, 160 - bit)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import math
+from asyncio import AbstractEventLoop, TimerHandle
+from typing import Callable, Dict, Generic, Hashable, List, Optional, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+ExpireCallback = Callable[[List[K]], None]
+
+
+class TimerWheel(Generic[K]):
+    """Coarse-grained deadlines sharing a single event loop timer.
+
+    Deadlines are rounded up to a multiple of `resolution` and grouped into
+    slots, so adding or discarding a deadline is a couple of dict operations
+    and all the keys of a slot are expired by one callback.
+    """
+
+    def __init__(self, loop: AbstractEventLoop,
+                 on_expire: ExpireCallback[K],
+                 resolution: float = .1) -> None:
+        self.loop = loop
+        self.on_expire = on_expire
+        self.resolution = resolution
+
+        self._slots: Dict[int, Dict[K, None]] = {}
+        self._deadlines: Dict[K, int] = {}
+        self._current = self._elapsed()
+        self._handle: Optional[TimerHandle] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._deadlines
+
+    def _elapsed(self) -> int:
+        return math.floor(self.loop.time() / self.resolution)
+
+    def add(self, key: K, delay: float) -> None:
+        self.discard(key)
+        if self._handle is None:
+            # idle wheel: skip the ticks elapsed since it was last used
+            self._current = self._elapsed()
+        tick = max(math.ceil((self.loop.time() + delay) / self.resolution),
+                   self._current + 1)
+        self._slots.setdefault(tick, {})[key] = None
+        self._deadlines[key] = tick
+        if self._handle is None:
+            self._schedule()
+
+    def discard(self, key: K) -> None:
+        tick = self._deadlines.pop(key, None)
+        if tick is None:
+            return
+        slot = self._slots[tick]
+        del slot[key]
+        if not slot:
+            del self._slots[tick]
+
+    def _schedule(self) -> None:
+        self._handle = self.loop.call_at(
+            (self._current + 1) * self.resolution, self._tick)
+
+    def _tick(self) -> None:
+        self._handle = None
+        # call_at() may fire up to one clock resolution early
+        now = max(self._elapsed(), self._current + 1)
+        expired: List[K] = []
+        if len(self._slots) < now - self._current:
+            ticks = sorted(t for t in self._slots if t <= now)
+        else:
+            ticks = [t for t in range(self._current + 1, now + 1)
+                     if t in self._slots]
+        for tick in ticks:
+            keys = self._slots.pop(tick)
+            for key in keys:
+                del self._deadlines[key]
+            expired.extend(keys)
+        self._current = now
+        if self._slots:
+            self._schedule()
+        if expired:
+            self.on_expire(expired)
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._slots.clear()
+        self._deadlines.clear()
@@ -0,0 +1,88 @@
+"""Binary traces of the datagrams a node receives and sends.
+
+A trace starts with a header naming the traced node, then holds one record
+per datagram: a fixed-size struct with the time since the capture started
+in nanoseconds, the direction, the lengths of the peer host and of the
+data and the peer port, followed by the host and the data themselves.
+Records are appended to a buffered file, so capturing costs a struct.pack()
+and a memory copy per datagram.
+"""
+from __future__ import annotations
+
+import struct
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Tuple
+
+from .node import ID, Addr, Node
+
+MAGIC = b'KADT\x01'
+RECEIVED, SENT = 0, 1
+_HEADER = struct.Struct('<20sBH')
+_RECORD = struct.Struct('<QBBHI')
+BUFFER_SIZE = 2 ** 20
+
+
+@dataclass
+class Record:
+    time: float
+    direction: int
+    addr: Addr
+    data: bytes
+
+
+class TraceWriter:
+    def __init__(self, f: BinaryIO, node: Node) -> None:
+        self.f = f
+        host = node.addr[0].encode()
+        f.write(MAGIC + _HEADER.pack(node.id.to_bytes(20, 'little'),
+                                     len(host), node.addr[1]) + host)
+        self._start = time.monotonic_ns()
+
+    @classmethod
+    def open(cls, path: str, node: Node) -> TraceWriter:
+        return cls(open(path, 'wb', buffering=BUFFER_SIZE), node)
+
+    def _write(self, direction: int, data: bytes, addr: Addr) -> None:
+        host = addr[0].encode()
+        self.f.write(_RECORD.pack(time.monotonic_ns() - self._start,
+                                  direction, len(host), addr[1], len(data))
+                     + host + data)
+
+    def received(self, data: bytes, addr: Addr) -> None:
+        self._write(RECEIVED, data, addr)
+
+    def sent(self, data: bytes, addr: Addr) -> None:
+        self._write(SENT, data, addr)
+
+    def close(self) -> None:
+        self.f.close()
+
+
+def _read(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise EOFError('truncated trace')
+    return data
+
+
+def read_trace(f: BinaryIO) -> Tuple[Node, Iterator[Record]]:
+    """The traced node and an iterator over the records of a trace."""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError('not a trace file')
+    id, host_len, port = _HEADER.unpack(_read(f, _HEADER.size))
+    host = _read(f, host_len).decode()
+    node = Node(ID(int.from_bytes(id, 'little')), (host, port))
+
+    def records() -> Iterator[Record]:
+        while True:
+            header = f.read(_RECORD.size)
+            if not header:
+                return
+            if len(header) != _RECORD.size:
+                raise EOFError('truncated trace')
+            ns, direction, host_len, port, size = _RECORD.unpack(header)
+            host = _read(f, host_len).decode()
+            yield Record(ns / 1e9, direction, (host, port), _read(f, size))
+
+    return node, records()
@@ -0,0 +1,60 @@
+from typing import List, Optional
+
+import pytest
+
+from kademlia import Node, Server, rpc
+from kademlia.simulation import Network
+from kademlia.trace import TraceWriter
+
+
+class Cluster:
+    """Servers and bare RPC endpoints closed together after a test."""
+
+    def __init__(self) -> None:
+        self.servers: List[Server] = []
+        self.protocols: List[rpc.RpcProtocol] = []
+
+    async def start(self, servers: List[Server],
+                    network: Optional[Network] = None,
+                    bootstrap: Optional[List[Node]] = None,
+                    trace: Optional[TraceWriter] = None) -> List[Server]:
+        """Start the servers on the network, or on their real ports.
+
+        Without `bootstrap` the first server starts alone and the others
+        join off it.
+        """
+        for server in servers:
+            transport = None
+            if network is not None:
+                transport = network.transport(server.node.addr)
+            await server.start(bootstrap, transport, trace)
+            self.servers.append(server)
+            if bootstrap is None:
+                bootstrap = [server.node]
+        return servers
+
+    async def rpc(self, node: Node, network: Optional[Network] = None,
+                  timeout: float = 1) -> rpc.RpcProtocol:
+        """An RPC endpoint of the node without any registered function."""
+        if network is None:
+            protocol = await rpc.start(node, timeout=timeout)
+        else:
+            protocol = rpc.attach(node, network.transport(node.addr),
+                                  timeout=timeout)
+        self.protocols.append(protocol)
+        return protocol
+
+    async def close(self) -> None:
+        while self.protocols:
+            self.protocols.pop().close()
+        while self.servers:
+            await self.servers.pop().close()
+
+
+@pytest.fixture
+async def cluster():
+    cluster = Cluster()
+    try:
+        yield cluster
+    finally:
+        await cluster.close()
@@ -0,0 +1,58 @@
+from collections import Counter
+
+import pytest
+
+from kademlia import ID, Server, bench
+from kademlia.simulation import Network
+
+
+def test_summarize():
+    assert bench.summarize([]) == {'count': 0}
+    summary = bench.summarize([i / 1000 for i in range(100, 0, -1)])
+    assert summary['count'] == 100
+    assert summary['mean'] == pytest.approx(50.5)
+    # nearest rank: the item at int(q * n) of the sorted latencies
+    assert summary['p50'] == pytest.approx(51)
+    assert summary['p90'] == pytest.approx(91)
+    assert summary['p99'] == pytest.approx(100)
+    assert summary['p999'] == pytest.approx(100)
+    assert bench.summarize([.002])['p50'] == pytest.approx(2)
+
+
+def test_key_chooser_uniform():
+    choose = bench.KeyChooser(bench.Workload(keys=10, seed=1))
+    assert len(set(choose.keys)) == 10
+    counts = Counter(choose() for _ in range(10000))
+    assert set(counts) == set(choose.keys)
+    assert max(counts.values()) < 2 * min(counts.values())
+    # the same seed chooses the same keys
+    assert bench.KeyChooser(bench.Workload(keys=10, seed=1)).keys == \
+        choose.keys
+
+
+def test_key_chooser_zipf():
+    choose = bench.KeyChooser(
+        bench.Workload(keys=100, distribution='zipf', zipf_s=1.))
+    counts = Counter(choose() for _ in range(10000))
+    first, second, last = (counts[choose.keys[i]] for i in (0, 1, 99))
+    # the i-th key is chosen with weight 1 / (i + 1), about 19% for the first
+    assert 1500 < first < 2300
+    assert 1.5 < first / second < 2.5
+    assert last < first / 20
+
+
+def test_key_chooser_unknown_distribution():
+    with pytest.raises(ValueError, match='pareto'):
+        bench.KeyChooser(bench.Workload(distribution='pareto'))
+
+
+@pytest.mark.asyncio
+async def test_reads_look_up(cluster):
+    network = Network(lambda src, dst: .002)
+    servers = await cluster.start(
+        [Server(('10.0.0.1', i), ID(i + 1)) for i in range(4)], network)
+    workload = bench.Workload(reads=1, keys=4, concurrency=4, duration=.2)
+    report = await bench.run(servers[0], workload, servers[1:])
+    reads = report['latency_ms']['read']
+    assert reads['count'] and reads['p50'] >= 4  # at least a round trip
+    assert report['errors'] == {'read': 0, 'write': 0}
@@ -0,0 +1,22 @@
+import random
+
+from kademlia.bloom import BloomFilter
+
+
+def test_membership():
+    rand = random.Random(0)
+    items = [(rand.getrandbits(160), rand.getrandbits(63))
+             for _ in range(2000)]
+    bloom = BloomFilter.build(items, len(items), seed=7)
+    assert all(item in bloom for item in items)
+
+    others = [(key, version + 1) for key, version in items]
+    false_positives = sum(item in bloom for item in others)
+    assert false_positives < len(others) * .02
+
+
+def test_seed_changes_positions():
+    items = [(i, 0) for i in range(100)]
+    a = BloomFilter.build(items, len(items), seed=1)
+    b = BloomFilter.build(items, len(items), seed=2)
+    assert a.bits != b.bits
@@ -0,0 +1,15 @@
+import pytest
+
+from kademlia import codec
+
+
+@pytest.mark.parametrize('name', list(codec.CODECS))
+def test_roundtrip(name):
+    data = b'kademlia' * 100
+    packed, used = codec.compress(data, codec.CODECS[name])
+    assert codec.decompress(packed, used) == data
+
+
+def test_incompressible():
+    data = bytes(range(16))
+    assert codec.compress(data, codec.LZMA) == (data, codec.NONE)
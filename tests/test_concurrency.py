@@ -0,0 +1,59 @@
+import pytest
+
+from kademlia import Config, ID, Server
+from kademlia.concurrency import AdaptiveConcurrency
+from kademlia.simulation import Network
+
+
+def test_additive_increase():
+    alpha = AdaptiveConcurrency(3, 1, 16)
+    for _ in range(30):
+        alpha.on_reply(.01, .01)
+    assert 8 <= int(alpha) <= 9
+
+
+def test_slow_replies_decrease():
+    alpha = AdaptiveConcurrency(8, 1, 16)
+    for _ in range(20):
+        alpha.on_reply(.1, .01)
+    assert int(alpha) < 8
+
+
+def test_mixed_latency_peers():
+    alpha = AdaptiveConcurrency(3, 1, 16)
+    # a nearby and a distant peer, each answering at its usual pace
+    for _ in range(100):
+        alpha.on_reply(.002, .002)
+        alpha.on_reply(.2, .2)
+    assert int(alpha) == 16
+    # the nearby peer slowing down is congestion
+    for _ in range(150):
+        alpha.on_reply(.02, .002)
+    assert int(alpha) < 8
+
+
+def test_timeout_halves_within_bounds():
+    alpha = AdaptiveConcurrency(8, 2, 16)
+    alpha.on_timeout()
+    assert int(alpha) == 4
+    for _ in range(5):
+        alpha.on_timeout()
+    assert int(alpha) == 2
+    for _ in range(1000):
+        alpha.on_reply(.01)
+    assert int(alpha) == 16
+
+
+@pytest.mark.asyncio
+async def test_adaptive_lookups_across_regions(cluster):
+    # even ports are close to each other, odd ones far from everyone
+    network = Network(lambda src, dst: .001 if src[1] % 2 == dst[1] % 2 == 0
+                      else .02)
+    config = Config(adaptive=True, asize=3)
+    servers = await cluster.start(
+        [Server(('10.0.0.1', i), ID(i * 2 ** 154 + 1), config)
+         for i in range(16)], network)
+    reader = servers[2]
+    for i in range(5):
+        await reader._lookup_node(ID(i * 2 ** 157 + 7))
+    assert int(reader.alpha) > config.asize
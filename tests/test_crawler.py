@@ -0,0 +1,55 @@
+import io
+import random
+from itertools import chain
+
+import pytest
+
+from kademlia import Config, ID, Node, Server
+from kademlia.crawler import Crawler, read_records
+from kademlia.simulation import Network
+
+
+@pytest.mark.asyncio
+async def test_crawl(cluster):
+    rand = random.Random(0)
+    network = Network(lambda src, dst: .001)
+    servers = await cluster.start(
+        [Server(('10.0.0.1', i), ID(rand.getrandbits(160)))
+         for i in range(60)], network)
+    dead = Node(ID(rand.getrandbits(160)), ('10.0.0.2', 0))
+    servers[0].routing_table[0].append(dead)
+    # nodes nobody has a contact of cannot be found
+    known = set(chain.from_iterable(
+        chain(*server.routing_table) for server in servers))
+
+    me = Node(ID(rand.getrandbits(160)), ('10.0.0.3', 0))
+    protocol = await cluster.rpc(me, network, timeout=.1)
+    out = io.BytesIO()
+    stats = await Crawler(protocol, out, 8, .001).crawl([servers[0].node])
+
+    assert stats.nodes == len(known)
+    assert stats.responsive == len(known) - 1
+    out.seek(0)
+    records = dict(read_records(out))
+    assert set(records) == known
+    assert records[dead] is None
+    assert all(records[node] >= .002 for node in known - {dead})
+    addrs = {s.node: s.node.addr for s in servers}
+    assert all(node.addr == addrs[node] for node in known - {dead})
+
+
+@pytest.mark.asyncio
+async def test_crawler_as_oldest_contact(cluster):
+    config = Config(ksize=1, timeout=1)
+    server, = await cluster.start([Server(('127.0.0.1', 7960), ID(1), config)])
+    me = Node(ID(2 ** 159 + 1), ('127.0.0.1', 7961))
+    protocol = await cluster.rpc(me)
+    await Crawler(protocol, io.BytesIO(), 8, .001).crawl([server.node])
+    contacts = [n for bucket in server.routing_table for n in bucket]
+    assert contacts == [me]
+
+    # the crawler is pinged as the oldest contact of a full bucket
+    new, = await cluster.start(
+        [Server(('127.0.0.1', 7962), ID(2 ** 159 + 2), config)], bootstrap=[])
+    assert await new.call(server.node, 'ping') == 'pong'
+    assert await new.rpc.find_value(me.addr, ID(5)) == ([], None)
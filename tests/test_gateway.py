@@ -0,0 +1,45 @@
+import aiohttp
+import pytest
+
+from kademlia import ID, Server
+from kademlia.gateway import Client, serve
+
+
+@pytest.fixture
+async def client(tmp_path):
+    dht = Server(('127.0.0.1', 7920), ID(1))
+    await dht.start()
+    path = str(tmp_path / 'kad.sock')
+    runner = await serve(dht, path)
+    try:
+        async with Client(path=path) as client:
+            yield client
+    finally:
+        await runner.cleanup()
+        await dht.close()
+
+
+@pytest.mark.asyncio
+async def test_get_set(client):
+    assert await client.get(100) is None
+    await client.set(100, b'value')
+    assert await client.get(100) == b'value'
+
+
+@pytest.mark.asyncio
+async def test_get_many(client):
+    await client.set(1, b'a')
+    await client.set(2, b'b')
+    assert await client.get_many([1, 2, 3]) == {1: b'a', 2: b'b', 3: None}
+
+
+@pytest.mark.asyncio
+async def test_invalid_keys(client):
+    for key in 'abc', -5, 2 ** 160:
+        with pytest.raises(aiohttp.ClientResponseError) as exc:
+            await client.get(key)
+        assert exc.value.status == 400
+    with pytest.raises(aiohttp.ClientResponseError):
+        await client.set(2 ** 160, b'value')
+    with pytest.raises(aiohttp.ClientResponseError):
+        await client.get_many([1, -5])
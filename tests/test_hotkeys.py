@@ -0,0 +1,43 @@
+import random
+
+from kademlia.hotkeys import CountMinSketch, HotKeys
+
+
+def test_sketch_overestimates():
+    rand = random.Random(0)
+    sketch = CountMinSketch(256, 4)
+    counts = {rand.getrandbits(160): rand.randrange(1, 50)
+              for _ in range(500)}
+    for key, count in counts.items():
+        sketch.add(key, count)
+    assert all(sketch[key] >= count for key, count in counts.items())
+    # errors are bounded by a fraction of the total count
+    total = sum(counts.values())
+    errors = [sketch[key] - count for key, count in counts.items()]
+    assert sorted(errors)[len(errors) // 2] < total * 2 / 256
+
+    sketch.decay()
+    key = next(iter(counts))
+    assert sketch[key] <= (counts[key] + max(errors)) // 2
+
+
+def test_sketch_out_of_range_keys():
+    sketch = CountMinSketch()
+    for key in -5, 2 ** 160:
+        assert sketch.add(key) >= 1
+        assert sketch[key] >= 1
+
+
+def test_hot_keys():
+    hot = HotKeys(threshold=3, window=10, ttl=4)
+    assert [hot.hit(1, 0) for _ in range(4)] == [False, False, True, False]
+    assert hot.keys[1].hits == 4
+    # copies are renewed halfway through their TTL
+    assert hot.hit(1, 1.9) is False
+    assert hot.hit(1, 2) is True
+    # counts halve every window
+    assert hot.hit(1, 10) is True
+    assert hot.keys[1].hits == 4
+    # keys are forgotten once their copies expired
+    assert hot.hit(2, 20) is False
+    assert list(hot.keys) == []
@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+import pytest
+
+from kademlia.monitor import Histogram, LoopMonitor
+
+
+def test_histogram():
+    hist = Histogram()
+    assert hist.summary() == {'count': 0}
+    for i in range(1, 101):
+        hist.add(i / 1000)
+    summary = hist.summary()
+    assert summary['count'] == 100
+    assert summary['mean'] == pytest.approx(50.5)
+    assert summary['max'] == pytest.approx(100)
+    # within a factor of two of the exact percentiles
+    assert 50 <= summary['p50'] <= 100
+    assert 99 <= summary['p99'] <= 100
+
+
+@pytest.mark.asyncio
+async def test_loop_lag(caplog):
+    monitor = LoopMonitor(asyncio.get_running_loop(), .01, threshold=.03)
+    monitor.start()
+    await asyncio.sleep(.02)
+    time.sleep(.05)
+    await asyncio.sleep(.02)
+    monitor.close()
+    assert monitor.lag.count >= 2
+    assert monitor.lag.max >= .03
+    assert any('lagged' in r.message for r in caplog.records)
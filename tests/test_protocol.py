@@ -0,0 +1,359 @@
+import asyncio
+import gc
+
+import pytest
+
+from kademlia import Config, ID, Node, Server, Value, codec
+from kademlia.bloom import BloomFilter
+from kademlia.protocol import KBucket, LookupQueue, QuorumError, \
+    wait_quorum, xor_key
+from kademlia.simulation import Network
+
+port = 7900
+
+
+@pytest.fixture
+async def servers():
+    servers = [Server(('127.0.0.1', port + i), ID(i + 1)) for i in range(8)]
+    await servers[0].start()
+    for server in servers[1:]:
+        await server.start([servers[0].node])
+    try:
+        yield servers
+    finally:
+        for server in servers:
+            await server.close()
+
+
+@pytest.mark.asyncio
+async def test_set_get(servers):
+    await servers[1].set(ID(100), b'value')
+    assert await servers[-1].get(ID(100)) == b'value'
+
+    with pytest.raises(KeyError):
+        await servers[-1].get(ID(200))
+
+    health = servers[0].health()
+    assert health['handlers']['find_node']['count'] > 0
+
+
+@pytest.mark.asyncio
+async def test_compression(servers):
+    data = b'abc' * 1000
+    await servers[1].set(ID(100), data)
+    await asyncio.sleep(.1)
+    stored = servers[2].storage[ID(100)]
+    assert stored.codec == codec.ZLIB
+    assert len(stored.data) < len(data)
+    assert await servers[-1].get(ID(100)) == data
+    assert [v.data async for v in servers[-1].get_all(ID(100))][0] == data
+
+
+@pytest.mark.asyncio
+async def test_lookup_progress(servers):
+    target = servers[3].node.id
+    lookup = servers[-1].lookup(target)
+    progress = [p async for p in lookup]
+    assert progress
+    assert progress[-1].closest[0] == servers[3].node
+
+
+@pytest.mark.asyncio
+async def test_lookup_skips_dead_nodes(cluster):
+    network = Network(lambda src, dst: .001)
+    servers = await cluster.start(
+        [Server(('10.0.0.1', i), ID(i + 1), Config(timeout=.1))
+         for i in range(8)], network)
+    dead = min(servers[1:-1], key=lambda s: s.node.id ^ 100)
+    await dead.close()
+    closest = await servers[-1]._lookup_node(ID(100))
+    assert closest and dead.node not in closest
+    progress = [p async for p in servers[-1].lookup(ID(100))]
+    assert any(p.failed and p.node == dead.node for p in progress)
+
+
+@pytest.mark.asyncio
+async def test_get_all(servers):
+    for server in servers[:3]:
+        server.storage[ID(100)] = Value(b'value', 1)
+    values = [v async for v in servers[-1].get_all(ID(100))]
+    assert values == [Value(b'value', 1)] * 3
+
+
+@pytest.mark.asyncio
+async def test_older_versions_ignored(servers):
+    await servers[1].set(ID(100), b'new', version=2)
+    await servers[2].set(ID(100), b'old', version=1)
+    await asyncio.sleep(.1)
+    assert all(s.storage[ID(100)].data == b'new' for s in servers)
+
+
+@pytest.mark.asyncio
+async def test_quorum_read(servers):
+    for server in servers[:4]:
+        server.storage[ID(100)] = Value(b'old', 1)
+    servers[4].storage[ID(100)] = Value(b'new', 2)
+    reader = servers[-1]
+    reader.config.read_quorum = 5
+    assert await reader.get(ID(100)) == b'new'
+
+    reader.config.read_quorum = 6
+    with pytest.raises(QuorumError):
+        await reader.get(ID(100))
+
+
+@pytest.mark.asyncio
+async def test_quorums_capped_in_small_networks(cluster):
+    network = Network(lambda src, dst: .001)
+    config = Config(write_quorum=3, read_quorum=3)
+    lone, = await cluster.start(
+        [Server(('10.0.0.1', 0), ID(1), config)], network)
+    await lone.set(ID(100), b'value')
+    assert await lone.get(ID(100)) == b'value'
+
+    other, = await cluster.start(
+        [Server(('10.0.0.1', 1), ID(2), config)], network, [lone.node])
+    await other.set(ID(200), b'value')
+    assert await lone.get(ID(200), local=False) == b'value'
+    # both nodes are replicas, only one holds the key
+    other.storage[ID(300)] = Value(b'value', 1)
+    with pytest.raises(QuorumError):
+        await other.get(ID(300))
+
+
+@pytest.mark.asyncio
+async def test_storage_limit(cluster):
+    full, other = await cluster.start([
+        Server(('127.0.0.1', 7940), ID(1), Config(max_keys=1)),
+        Server(('127.0.0.1', 7941), ID(2))])
+    await other.rpc.call(full.node.addr, 'store', ID(5), Value(b'a', 1))
+    # replacing a stored key is still accepted
+    await other.rpc.call(full.node.addr, 'store', ID(5), Value(b'b', 2))
+    with pytest.raises(MemoryError, match='StorageFull'):
+        await other.rpc.call(full.node.addr, 'store', ID(6), Value(b'c', 1))
+    assert list(full.storage) == [ID(5)]
+
+
+@pytest.mark.asyncio
+async def test_erroring_contact_evicted(cluster):
+    config = Config(ksize=1, timeout=1)
+    server, = await cluster.start([Server(('127.0.0.1', 7950), ID(1), config)])
+    # answers every call but find_node with an error
+    bare = await cluster.rpc(Node(ID(2 ** 159 + 1), ('127.0.0.1', 7951)))
+    await bare.call(server.node.addr, 'ping')
+    new, = await cluster.start(
+        [Server(('127.0.0.1', 7952), ID(2 ** 159 + 2), config)], bootstrap=[])
+    assert await new.call(server.node, 'ping') == 'pong'
+    contacts = [n.id for bucket in server.routing_table for n in bucket]
+    assert contacts == [new.node.id]
+
+
+@pytest.mark.asyncio
+async def test_get_cancels_lookup(servers):
+    await servers[1].set(ID(100), b'value')
+    await servers[-1].get(ID(100))
+    await asyncio.sleep(0)
+    assert not servers[-1].rpc.requests
+
+
+@pytest.mark.asyncio
+async def test_wait_quorum():
+    loop = asyncio.get_running_loop()
+    futures = [loop.create_future() for _ in range(3)]
+    futures[0].set_exception(asyncio.TimeoutError())
+    futures[1].set_result(1)
+    assert await wait_quorum(futures, 1) == [1]
+
+    futures[2].set_exception(asyncio.TimeoutError())
+    with pytest.raises(QuorumError):
+        await wait_quorum(futures, 2)
+
+
+@pytest.mark.asyncio
+async def test_wait_quorum_failure_ignores_pending():
+    loop = asyncio.get_running_loop()
+    errors = []
+    loop.set_exception_handler(lambda loop, context: errors.append(context))
+    futures = [loop.create_future() for _ in range(3)]
+    futures[0].set_exception(ValueError())
+    with pytest.raises(QuorumError):
+        await wait_quorum(futures, 3)
+    for fut in futures[1:]:
+        fut.set_exception(ValueError())
+    await asyncio.sleep(0)
+    del futures, fut
+    gc.collect()
+    loop.set_exception_handler(None)
+    assert not errors
+
+
+def test_kbucket_divide():
+    bucket = KBucket((0, 2 ** 160))
+    bucket.extend(Node(ID(i), ('127.0.0.1', i)) for i in (1, 2 ** 159 + 1))
+    left, right = bucket.divide()
+    assert [n.id for n in left] == [1]
+    assert [n.id for n in right] == [2 ** 159 + 1]
+
+
+def test_lookup_queue_prefers_low_rtt():
+    nodes = [Node(ID(i), ('127.0.0.1', i)) for i in (4, 5, 6, 7, 64)]
+    rtt = {nodes[0]: .3, nodes[1]: .2, nodes[2]: .1, nodes[3]: .4}
+    queue = LookupQueue(xor_key(ID(0)), nodes, rtt=lambda n: rtt.get(n, 0))
+    assert [queue.get_nowait().id for _ in nodes] == [6, 5, 4, 7, 64]
+
+
+@pytest.mark.asyncio
+async def test_simulated_network(cluster):
+    network = Network(lambda src, dst: .001)
+    servers = await cluster.start(
+        [Server(('10.0.0.1', i), ID(i + 1)) for i in range(8)], network)
+    await servers[1].set(ID(100), b'value')
+    assert await servers[-1].get(ID(100)) == b'value'
+    assert servers[-1].rtt.get(servers[0].node) >= .002
+
+
+@pytest.mark.asyncio
+async def test_handoff_on_join(cluster):
+    old, = await cluster.start([Server(('127.0.0.1', 7930), ID(1))])
+    old.storage[ID(2 ** 159 + 5)] = Value(b'theirs', 1)
+    old.storage[ID(5)] = Value(b'ours', 1)
+    new, = await cluster.start([Server(('127.0.0.1', 7931), ID(2 ** 159))],
+                               bootstrap=[old.node])
+    await asyncio.sleep(.1)
+    assert list(new.storage) == [ID(2 ** 159 + 5)]
+
+
+@pytest.mark.asyncio
+async def test_handoff_by_replicas_only(cluster):
+    network = Network(lambda src, dst: .001)
+    config = Config(ksize=2, sync_interval=0)
+    server, = await cluster.start(
+        [Server(('10.0.0.1', 0), ID(0), config)], network)
+    # a copy kept by the writer, two known nodes are closer to the key
+    key = ID(2 ** 159 + 2 ** 158)
+    server.storage[key] = Value(b'value', 1)
+    await cluster.start(
+        [Server(('10.0.0.1', 1), ID(2 ** 158), config),
+         Server(('10.0.0.1', 2), ID(2 ** 158 + 1), config)],
+        network, [server.node])
+    new, = await cluster.start(
+        [Server(('10.0.0.1', 3), ID(2 ** 159 + 2 ** 157), config)],
+        network, [server.node])
+    await asyncio.sleep(.05)
+    assert new.node in server.get_closest_nodes(key)
+    assert key not in new.storage
+
+
+@pytest.mark.asyncio
+async def test_handoff_needs_reply(cluster):
+    network = Network(lambda src, dst: .001)
+    server, = await cluster.start(
+        [Server(('10.0.0.1', 0), ID(0), Config(timeout=.1))], network)
+    server.storage[ID(2 ** 159 + 5)] = Value(b'value', 1)
+    victim = await cluster.rpc(Node(ID(1), ('10.0.0.1', 1)), network)
+    stored = []
+
+    @victim.register
+    def store(key: ID, value: Value) -> None:
+        stored.append(key)
+
+    # claims the victim's address, which answers ping with an error
+    spoofer = await cluster.rpc(Node(ID(2), ('10.0.0.1', 2)), network)
+    spoofer.caller = Node(ID(2 ** 159), victim.caller.addr)
+    await spoofer.call(server.node.addr, 'ping')
+    await asyncio.sleep(.05)
+    assert not stored
+
+
+@pytest.mark.asyncio
+async def test_anti_entropy(servers):
+    a, b = servers[:2]
+    for i in range(100):
+        a.storage[ID(i)] = Value(b'a', 1)
+    for i in range(50, 150):
+        b.storage[ID(i)] = Value(b'b', 2 if i < 60 else 1)
+    # keys 50-59 are pushed both ways, only the newer version is kept
+    assert await a.sync_with(b.node) == 60
+    await asyncio.sleep(.2)
+    for server in a, b:
+        assert len(server.storage) == 150
+        assert server.storage[ID(55)] == Value(b'b', 2)
+        assert server.storage[ID(70)].version == 1
+
+
+@pytest.mark.asyncio
+async def test_anti_entropy_pushes_to_replicas_only(cluster):
+    config = Config(ksize=1, sync_interval=0)
+    a, b = await cluster.start([
+        Server(('127.0.0.1', 7970), ID(1), config),
+        Server(('127.0.0.1', 7971), ID(2 ** 159), config)])
+    near_a = [ID(i) for i in range(10)]
+    near_b = [ID(2 ** 159 + i) for i in range(10)]
+    for key in near_a + near_b:
+        a.storage[key] = Value(b'a', 1)
+        b.storage[ID(key + 100)] = Value(b'b', 1)
+    assert await a.sync_with(b.node) == len(near_b)
+    await asyncio.sleep(.2)
+    assert sorted(b.storage) == sorted(
+        [ID(k + 100) for k in near_a + near_b] + near_b)
+    assert sorted(a.storage) == sorted(
+        near_a + near_b + [ID(k + 100) for k in near_a])
+
+
+@pytest.mark.asyncio
+async def test_sync_replies_to_real_address(cluster):
+    server, = await cluster.start([Server(('127.0.0.1', 7972), ID(1))])
+    server.storage[ID(5)] = Value(b'value', 1)
+    # claims the address of the server itself
+    me = Node(ID(2), ('127.0.0.1', 7972))
+    bare = await cluster.rpc(Node(me.id, ('127.0.0.1', 7973)))
+    stored = []
+
+    @bare.register
+    def store(key: ID, value: Value) -> None:
+        stored.append(key)
+
+    bare.caller = me
+    await bare.call(server.node.addr, 'sync', ID(0), ID(2 ** 160),
+                    BloomFilter.build([], 0))
+    await asyncio.sleep(.1)
+    assert stored == [ID(5)]
+
+
+@pytest.mark.asyncio
+async def test_sync_summary_capped(cluster):
+    config = Config(sync_interval=0, sync_chunk=100, sync_filter_bits=1024)
+    a, b = await cluster.start([
+        Server(('127.0.0.1', 7974), ID(1), config),
+        Server(('127.0.0.1', 7975), ID(2), config)])
+    for i in range(5000):
+        b.storage[ID(2 * i)] = Value(b'b', 1)
+    for i in range(50):
+        a.storage[ID(2 * i + 1)] = Value(b'a', 1)
+    # a saturated filter of all of b's keys would hide what b lacks
+    assert await a.sync_with(b.node) >= 45
+
+
+@pytest.mark.asyncio
+async def test_hot_key_cached(cluster):
+    config = Config(ksize=4, hot_threshold=5, hot_fanout=4, hot_ttl=.5,
+                    sync_interval=0)
+    network = Network(lambda src, dst: .001)
+    servers = await cluster.start(
+        [Server(('10.0.0.1', i), ID(i * 2 ** 155), config)
+         for i in range(32)], network)
+    key = ID(3)
+    await servers[-1].set(key, b'value')
+    holders = {s for s in servers if key in s.storage}
+
+    for server in servers * 2:
+        if server not in holders:
+            assert await server.get(key) == b'value'
+    await asyncio.sleep(.05)
+    hot = [s.health()['hot_keys'] for s in holders]
+    assert any(h.get(repr(key), {}).get('fanout') for h in hot)
+    cached = [s for s in servers if s.health()['cached']]
+    assert cached and not set(cached) & holders
+
+    await asyncio.sleep(.7)
+    assert all(key not in s.storage for s in cached)
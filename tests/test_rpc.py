@@ -1,10 +1,11 @@
 import asyncio
 import random
+import time
 
 import pytest
 
 from kademlia import ID, Node
-from kademlia.rpc import start, Call
+from kademlia.rpc import start, RpcError
 
 addr = ('127.0.0.1', 7890)
 node = Node(ID(123), addr)
@@ -39,8 +40,6 @@ async def test_async_rpc_func(rpc):
         assert await rpc.async_echo(addr, i) == i
 
 
-# FIXME: Exceptions cannot be dumped by the serializer now.
-'''
 @pytest.mark.asyncio
 async def test_exceptions(rpc):
     @rpc.register
@@ -59,7 +58,29 @@ async def test_exceptions(rpc):
 
     with pytest.raises(TypeError):
         await rpc.no_args(addr, 'arg')
-'''
+
+
+@pytest.mark.asyncio
+async def test_error_reply_is_fast(rpc):
+    @rpc.register
+    def throw():
+        raise KeyError('missing')
+
+    with pytest.raises(RpcError) as info:
+        await asyncio.wait_for(rpc.throw(addr), .5)
+    assert isinstance(info.value, KeyError)
+    assert 'missing' in str(info.value)
+
+
+@pytest.mark.asyncio
+async def test_remote_timeout_is_not_local(rpc):
+    @rpc.register
+    def throw():
+        raise TimeoutError('remote')
+
+    with pytest.raises(RpcError) as info:
+        await rpc.throw(addr)
+    assert not isinstance(info.value, asyncio.TimeoutError)
 
 
 @pytest.mark.asyncio
@@ -72,6 +93,19 @@ async def test_timeout(rpc):
         await rpc.f(('127.0.0.1', 1111))
 
 
+@pytest.mark.asyncio
+async def test_cancelled_call(rpc):
+    @rpc.register
+    def f():
+        pass
+
+    fut = rpc.f(('127.0.0.1', 1111))
+    fut.cancel()
+    await asyncio.sleep(0)
+    assert not rpc.requests
+    assert len(rpc.timeouts) == 0
+
+
 @pytest.mark.asyncio
 async def test_concurrent_calls(rpc):
     @rpc.register
@@ -99,3 +133,18 @@ async def test_on_rpc_callback():
         await rpc.f(addr)
     finally:
         rpc.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_handler_logged(rpc, caplog):
+    rpc.slow_callback = .01
+
+    @rpc.register
+    def stall(data: bytes) -> None:
+        time.sleep(.02)
+
+    await rpc.stall(addr, bytes(1000))
+    assert rpc.handler_times['stall'].count == 1
+    assert rpc.handler_times['stall'].max >= .02
+    [record] = [r for r in caplog.records if 'stall()' in r.message]
+    assert 'byte request' in record.message
@@ -3,6 +3,8 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import List, Dict, FrozenSet, Tuple, TypeVar, Generic, Union, Any
 
+import pytest
+
 from kademlia.serializer import dumps, loads
 
 
@@ -58,6 +60,20 @@ A = TypeVar('A')
 R = TypeVar('R')
 
 
+def test_big_ints():
+    for i in (2 ** 160 - 1, -2 ** 100, 2 ** 64, -2 ** 63 - 1):
+        assert loads(int, dumps(i)) == i
+    a = [2 ** 159, 1]
+    assert loads(List[int], dumps(a)) == a
+
+
+def test_tuple_length_mismatch():
+    with pytest.raises(TypeError):
+        loads(Tuple[int, int], dumps((1, 2, 3)))
+    with pytest.raises(TypeError):
+        loads(Tuple[()], dumps(('arg',)))
+
+
 def test_subscripted_generic():
     @dataclass
     class Func(Generic[A, R]):
@@ -0,0 +1,49 @@
+import random
+
+from kademlia.storage import Storage, Value
+
+
+def make_storage(keys):
+    storage = Storage()
+    for key in keys:
+        storage[key] = Value(b'', 0)
+    return storage
+
+
+def test_mapping():
+    storage = make_storage([3, 1, 2])
+    assert len(storage) == 3
+    assert 2 in storage
+    del storage[2]
+    assert 2 not in storage
+    assert sorted(storage) == [1, 3]
+    storage[2] = Value(b'x', 1)
+    assert storage[2] == Value(b'x', 1)
+
+
+def test_range_and_prefix():
+    storage = make_storage([0b0001, 0b0100, 0b0101, 0b0111, 0b1000])
+    assert storage.range(0b0100, 0b0110) == [0b0100, 0b0101]
+    assert storage.prefix(0b01, 2, size=4) == [0b0100, 0b0101, 0b0111]
+    del storage[0b0101]
+    assert storage.prefix(0b01, 2, size=4) == [0b0100, 0b0111]
+    # deleted keys still in the index are not counted
+    assert storage.range(0, 16, 3) == [0b0001, 0b0100, 0b0111]
+    assert storage.range(0b0100, 16, 0) == []
+
+
+def test_branch():
+    rand = random.Random(0)
+    me = rand.getrandbits(160)
+    keys = {me ^ rand.getrandbits(rand.randrange(160)) for _ in range(2000)}
+    storage = make_storage(keys)
+    for key in rand.sample(sorted(keys), 500):
+        del storage[key]
+        keys.remove(key)
+    for _ in range(20):
+        bit = rand.randrange(160)
+        new = me ^ (1 << bit) ^ rand.getrandbits(bit)
+        expected = sorted(k for k in keys
+                          if k ^ new < k ^ me and (k ^ me) >> bit == 1)
+        assert storage.branch(new, me) == expected
+    assert storage.branch(me, me) == []
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from kademlia.timer import TimerWheel
+
+
+@pytest.mark.asyncio
+async def test_expire_in_batches():
+    batches = []
+    wheel = TimerWheel(asyncio.get_running_loop(), batches.append, .05)
+    for i in range(100):
+        wheel.add(i, .01)
+    wheel.add('late', .2)
+    assert len(wheel) == 101
+
+    await asyncio.sleep(.12)
+    assert batches == [list(range(100))]
+    assert len(wheel) == 1
+
+    await asyncio.sleep(.2)
+    assert batches[1:] == [['late']]
+    assert len(wheel) == 0
+
+
+@pytest.mark.asyncio
+async def test_discard():
+    batches = []
+    wheel = TimerWheel(asyncio.get_running_loop(), batches.append, .05)
+    wheel.add(1, .01)
+    wheel.add(2, .01)
+    wheel.discard(1)
+    wheel.discard(3)
+    await asyncio.sleep(.12)
+    assert batches == [[2]]
+
+
+@pytest.mark.asyncio
+async def test_close():
+    batches = []
+    wheel = TimerWheel(asyncio.get_running_loop(), batches.append, .05)
+    wheel.add(1, .01)
+    wheel.close()
+    await asyncio.sleep(.12)
+    assert batches == []
+    assert len(wheel) == 0
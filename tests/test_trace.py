@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+from kademlia import ID, Node, Server
+from kademlia.replay import replay
+from kademlia.rpc import Message
+from kademlia.simulation import Network
+from kademlia.trace import RECEIVED, SENT, TraceWriter, read_trace
+
+
+def test_round_trip():
+    f = io.BytesIO()
+    writer = TraceWriter(f, Node(ID(2 ** 159), ('10.0.0.1', 7890)))
+    writer.received(b'abc', ('10.0.0.2', 1))
+    writer.sent(b'', ('::1', 65535))
+    f.seek(0)
+    node, records = read_trace(f)
+    assert node == Node(ID(2 ** 159), ('10.0.0.1', 7890))
+    assert node.addr == ('10.0.0.1', 7890)
+    first, second = records
+    assert (first.direction, first.addr, first.data) == \
+        (RECEIVED, ('10.0.0.2', 1), b'abc')
+    assert (second.direction, second.addr, second.data) == \
+        (SENT, ('::1', 65535), b'')
+    assert 0 <= first.time <= second.time
+
+
+def test_truncated():
+    f = io.BytesIO()
+    TraceWriter(f, Node(ID(1), ('10.0.0.1', 1))).received(b'abc', ('h', 1))
+    node, records = read_trace(io.BytesIO(f.getvalue()[:-1]))
+    with pytest.raises(EOFError):
+        list(records)
+    with pytest.raises(ValueError):
+        read_trace(io.BytesIO(b'junk'))
+
+
+@pytest.mark.asyncio
+async def test_capture_and_replay(cluster, caplog):
+    network = Network(lambda src, dst: .001)
+    servers = [Server(('10.0.0.1', i), ID(i + 1)) for i in range(4)]
+    f = io.BytesIO()
+    traced = servers[0]
+    await cluster.start([traced], network,
+                        trace=TraceWriter(f, traced.node))
+    await cluster.start(servers[1:], network, [traced.node])
+    await servers[1].set(ID(100), b'value')
+    await servers[2].get(ID(100))
+    await traced.get(ID(100), local=False)
+    await cluster.close()
+
+    f.seek(0)
+    node, records = read_trace(f)
+    records = list(records)
+    received = [r for r in records if r.direction == RECEIVED]
+    assert node == traced.node
+    assert received and len(received) < len(records)
+
+    f.seek(0)
+    # as in a new process
+    Message.id_gen = 0
+    report = await replay(f)
+    calls = [Message.peek(r.data) for r in records if r.direction == SENT]
+    assert Message.id_gen > max(id for id, is_call in calls if is_call)
+    assert report['datagrams'] == len(received)
+    assert report['sent'] > 0
+    stages = report['stages_ms']
+    assert stages['decode']['count'] == len(received)
+    assert stages['find_node()']['count'] > 0
+    assert stages['encode']['count'] > 0
+    # replies to the calls of the traced node are matched
+    assert not [r for r in caplog.records if 'not found' in r.message]
+
+    f.seek(0)
+    paced = await replay(f, speed=10)
+    assert paced['datagrams'] == len(received)
+    assert paced['elapsed'] >= received[-1].time / 10